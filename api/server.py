@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Optional
+
+import tornado.web
+from dotenv import load_dotenv
+
+from core.data import load_json
+from core.db import email_history, ensure_db, write_audit
+from core.inbox import inbox_rows
+from core.shards import assign_emails
+from core.sla import backfill_sla
+from core.stp import run_stp
+from core.threads import index_threads
+from core.tickets_full import (
+    TICKET_STATUSES,
+    add_followup,
+    bulk_update_tickets,
+    count_tickets,
+    create_or_update_ticket,
+    followup_parent,
+    get_ticket,
+    list_tickets,
+    ticket_metrics,
+)
+
+
+# JSON API for ERP/RPA clients. Runs as its own process next to Streamlit:
+#   python -m api.server --port 8600
+# Set FINOPS_API_TOKEN to require "Authorization: Bearer <token>".
+# Intake (threading, shard assignment, STP) runs once at start and again on
+# POST /api/inbox/ingest; GET endpoints never write.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+TICKET_FIELDS = ("email_id", "status", "title", "request_type", "queue", "assignee", "priority", "from_email", "subject", "payload")
+
+# SQLite calls are blocking; they run on a bounded worker pool so the event
+# loop keeps serving while at most this many connections are open at once.
+DB_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="finops-db")
+
+_reference_cache: Dict[str, tuple] = {}
+# One intake pass at a time (index_threads and run_stp are not safe to overlap).
+_intake_lock = asyncio.Lock()
+
+
+def _load_reference(name: str) -> Any:
+    path = os.path.join("data", name)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _reference_cache.get(name)
+    if not cached or cached[0] != mtime:
+        cached = (mtime, load_json(path))
+        _reference_cache[name] = cached
+    return cached[1]
+
+
+def ingest() -> dict:
+    emails = _load_reference("inbox_emails.json")
+    agent_cache = _load_reference("agent_cache.json")
+    threaded = index_threads(emails)
+    assign_emails(emails, agent_cache)
+    decisions = run_stp(emails, agent_cache, _load_reference("demo_users.json"))
+    return {"threaded": len(threaded), "stp_decisions": len(decisions)}
+
+
+def _bulk_options() -> Dict[str, list]:
+    # The values the Ticket Queue's bulk form offers for each field.
+    users = _load_reference("demo_users.json")
+    return {
+        "status": TICKET_STATUSES,
+        "queue": [q["display_name"] for q in users["queues"]],
+        "assignee": [a["name"] for a in users["assignees"]],
+        "priority": users["priorities"],
+    }
+
+
+def _ticket_out(t: dict) -> dict:
+    t = dict(t)
+    t["payload"] = json.loads(t.pop("payload_json"))
+    return t
+
+
+class ApiHandler(tornado.web.RequestHandler):
+    def prepare(self):
+        token = os.getenv("FINOPS_API_TOKEN")
+        if token and self.request.headers.get("Authorization") != f"Bearer {token}":
+            raise tornado.web.HTTPError(401, reason="Missing or invalid API token")
+
+    async def db(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(DB_POOL, partial(fn, *args, **kwargs))
+
+    def json_body(self) -> dict:
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Body must be JSON")
+        if not isinstance(body, dict):
+            raise tornado.web.HTTPError(400, reason="Body must be a JSON object")
+        return body
+
+    def actor(self, body: Optional[dict] = None) -> str:
+        return (body or {}).get("actor") or self.request.headers.get("X-Actor") or "API Client"
+
+    def page_args(self) -> tuple:
+        try:
+            page = max(int(self.get_argument("page", "1")), 1)
+            size = min(max(int(self.get_argument("page_size", str(DEFAULT_PAGE_SIZE))), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="page and page_size must be integers")
+        return page, size
+
+    def send(self, obj: Any, status: int = 200):
+        # GET responses get an ETag from Tornado's default compute_etag (SHA1 of the
+        # body); a matching If-None-Match is answered with 304 and no body.
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(obj, ensure_ascii=False))
+
+    def write_error(self, status_code: int, **kwargs):
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps({"error": self._reason, "status": status_code}))
+
+
+class HealthHandler(ApiHandler):
+    def get(self):
+        self.send({"ok": True})
+
+
+class TicketsHandler(ApiHandler):
+    async def get(self):
+        page, size = self.page_args()
+        filters = {k: self.get_argument(k, None) for k in ("status", "queue", "assignee", "sort")}
+        items = await self.db(list_tickets, {**filters, "limit": size, "offset": (page - 1) * size})
+        total = await self.db(count_tickets, filters)
+        self.send({"items": [_ticket_out(t) for t in items], "page": page, "page_size": size, "total": total})
+
+    async def post(self):
+        body = self.json_body()
+        missing = [f for f in TICKET_FIELDS if f not in body]
+        if missing:
+            raise tornado.web.HTTPError(400, reason=f"Missing fields: {', '.join(missing)}")
+        wrong = [f for f in TICKET_FIELDS if f != "payload" and not isinstance(body[f], str)]
+        if wrong:
+            raise tornado.web.HTTPError(400, reason=f"Fields must be strings: {', '.join(wrong)}")
+        if not isinstance(body["payload"], dict):
+            raise tornado.web.HTTPError(400, reason="payload must be a JSON object")
+        extraction = body["payload"].get("extraction", {})
+        if not isinstance(extraction, dict):
+            raise tornado.web.HTTPError(400, reason="payload.extraction must be a JSON object")
+        if not isinstance(extraction.get("due_date", ""), (str, type(None))):
+            raise tornado.web.HTTPError(400, reason="payload.extraction.due_date must be a string")
+        if body["status"] not in TICKET_STATUSES:
+            raise tornado.web.HTTPError(400, reason=f"Unknown ticket status: {body['status']}")
+        args = {f: body[f] for f in TICKET_FIELDS}
+        parent = await self.db(followup_parent, args["email_id"])
+        if parent:
+            # A follow-up in an already-ticketed thread leaves the ticket as it is.
+            details = {"status": args["status"], "subject": args["subject"], "from_email": args["from_email"], "source": "api"}
+            await self.db(add_followup, parent, args["email_id"], self.actor(body), details)
+            self.send(_ticket_out(await self.db(get_ticket, parent)), status=200)
+            return
+        ticket_id = await self.db(create_or_update_ticket, **args)
+        await self.db(write_audit, "ticket", ticket_id, "TICKET_CREATED_OR_UPDATED", self.actor(body), {"status": args["status"], "source": "api"})
+        self.send(_ticket_out(await self.db(get_ticket, ticket_id)), status=201)
+
+
+class TicketHandler(ApiHandler):
+    async def get(self, ticket_id: str):
+        t = await self.db(get_ticket, ticket_id)
+        if not t:
+            raise tornado.web.HTTPError(404, reason=f"Unknown ticket {ticket_id}")
+        out = _ticket_out(t)
+        if self.get_argument("history", "0") == "1":
+            out["history"] = (await self.db(email_history, t["email_id"], limit=100))["events"]
+        self.send(out)
+
+
+class BulkTicketsHandler(ApiHandler):
+    async def post(self):
+        body = self.json_body()
+        ids = body.get("ticket_ids")
+        changes = body.get("changes")
+        if not isinstance(ids, list) or not isinstance(changes, dict):
+            raise tornado.web.HTTPError(400, reason="Expected {ticket_ids: [...], changes: {...}}")
+        if not all(isinstance(t, str) and t for t in ids):
+            raise tornado.web.HTTPError(400, reason="ticket_ids must be non-empty strings")
+        options = _bulk_options()
+        for field, value in changes.items():
+            if field not in options:
+                raise tornado.web.HTTPError(400, reason=f"Unsupported bulk field: {field}")
+            # null or "" leaves the field unchanged, as in bulk_update_tickets.
+            if value not in (None, "") and (not isinstance(value, str) or value not in options[field]):
+                raise tornado.web.HTTPError(400, reason=f"Unknown {field}: {value!r}")
+        try:
+            results = await self.db(bulk_update_tickets, ids, changes, self.actor(body))
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, reason=str(e))
+        self.send({"results": results, "failed": sum(1 for r in results if not r["ok"])})
+
+
+class MetricsHandler(ApiHandler):
+    async def get(self):
+        self.send(await self.db(ticket_metrics))
+
+
+class InboxHandler(ApiHandler):
+    async def get(self):
+        page, size = self.page_args()
+        emails = _load_reference("inbox_emails.json")
+        agent_cache = _load_reference("agent_cache.json")
+        rows = await self.db(inbox_rows, emails, agent_cache)
+        status = self.get_argument("status", None)
+        if status:
+            rows = [r for r in rows if r["review_status"] == status]
+        start = (page - 1) * size
+        self.send({"items": rows[start : start + size], "page": page, "page_size": size, "total": len(rows)})
+
+
+class IngestHandler(ApiHandler):
+    async def post(self):
+        # Picks up a changed inbox or agent cache without a restart.
+        async with _intake_lock:
+            self.send(await self.db(ingest))
+
+
+def make_app() -> tornado.web.Application:
+    return tornado.web.Application(
+        [
+            (r"/api/health", HealthHandler),
+            (r"/api/tickets", TicketsHandler),
+            (r"/api/tickets/bulk", BulkTicketsHandler),
+            (r"/api/tickets/([A-Za-z0-9_-]+)", TicketHandler),
+            (r"/api/metrics", MetricsHandler),
+            (r"/api/inbox", InboxHandler),
+            (r"/api/inbox/ingest", IngestHandler),
+        ]
+    )
+
+
+async def serve(host: str, port: int):
+    app = make_app()
+    app.listen(port, address=host)
+    print(f"Finance Ops API listening on http://{host}:{port}/api")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Finance Ops Intake HTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args()
+
+    load_dotenv()
+    ensure_db()
+    backfill_sla()
+    ingest()
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,15 +14,8 @@ if not st.session_state.auth:
     st.stop()
 
 
-import os
-import streamlit as st
-from dotenv import load_dotenv
-
-from core.data import load_json, index_emails
-from core.db import ensure_db
-from ui.inbox import render_inbox
-from ui.approval import render_approval
-from ui.ticket_queue import render_ticket_queue
+from core.email_store import load_agent_entry, load_email
+from ui.startup import email_store, ingest_inbox, init_process, invalidate_reference_data, load_data
 
 APP_TITLE = "Demo 1 — Finance Ops Intake"
 
@@ -48,30 +41,45 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-load_dotenv()
-ensure_db()
+init_process()
+ingest_inbox()
 
-emails = load_json(os.path.join("data", "inbox_emails.json"))
-emails_by_id = index_emails(emails)
-agent_cache = load_json(os.path.join("data", "agent_cache.json"))
-demo_users = load_json(os.path.join("data", "demo_users.json"))
+# Shared by all sessions; full emails and agent suggestions are read on demand.
+store = email_store()
+demo_users = load_data("demo_users.json")
 
 # session defaults
 if "page" not in st.session_state:
     st.session_state.page = "Inbox"
-if "active_email_id" not in st.session_state:
-    st.session_state.active_email_id = emails[0]["email_id"]
+if st.session_state.get("active_email_id") not in store["by_id"]:
+    st.session_state.active_email_id = store["records"][0].email_id
 
 st.sidebar.title("Demo 1")
-page = st.sidebar.radio("Navigate", ["Inbox", "Approval", "Ticket Queue"], index=["Inbox","Approval","Ticket Queue"].index(st.session_state.page))
+page = st.sidebar.radio("Navigate", ["Inbox", "Approval", "Ticket Queue", "Dashboard", "Automation"], index=["Inbox","Approval","Ticket Queue","Dashboard","Automation"].index(st.session_state.page))
 st.session_state.page = page
+if st.sidebar.button("🔄 Reload data", use_container_width=True):
+    invalidate_reference_data()
+    st.rerun()
 
-active_email = emails_by_id[st.session_state.active_email_id]
-cached = agent_cache[st.session_state.active_email_id]
-
+# Page modules are imported on demand so a rerun only pays for the page it shows.
 if page == "Inbox":
-    render_inbox(emails, agent_cache, st.session_state.active_email_id)
+    from ui.inbox import render_inbox
+
+    render_inbox(store, st.session_state.active_email_id)
 elif page == "Approval":
-    render_approval(active_email, cached, demo_users)
-else:
+    from ui.approval import render_approval
+
+    email_id = st.session_state.active_email_id
+    render_approval(load_email(store, email_id), load_agent_entry(store, email_id), demo_users)
+elif page == "Ticket Queue":
+    from ui.ticket_queue import render_ticket_queue
+
     render_ticket_queue(demo_users)
+elif page == "Dashboard":
+    from ui.dashboard import render_dashboard
+
+    render_dashboard()
+else:
+    from ui.automation import render_automation
+
+    render_automation()
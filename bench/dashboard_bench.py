@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core.db as db  # noqa: E402
+from core.analytics import dashboard_metrics  # noqa: E402
+
+
+# Dashboard render cost at scale: seeds a scratch DB with synthetic tickets and
+# status transitions, then times the first (full) snapshot load, warm renders
+# and renders after a small batch of new writes. Never touches storage/demo.db.
+
+QUEUES = ["AP", "AR", "Treasury", "Vendor Master", "Expenses"]
+ASSIGNEES = [f"Analyst {i:02d}" for i in range(12)]
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat(timespec="seconds")
+
+
+def seed(n: int, rng: random.Random, now: datetime, start: int = 1001, spread_days: int = 30):
+    # Tickets are created up to spread_days before `now`; spread_days=0 stamps
+    # every ticket and transition with `now`, like a live write.
+    c = db.conn()
+    cur = c.cursor()
+    cur.execute("BEGIN")
+    tickets, events = [], []
+    for i in range(n):
+        tid = f"FIN-{start + i}"
+        created = now - timedelta(seconds=rng.randint(0, spread_days * 86400))
+        status = "Open"
+        events.append((f"BENCH-{tid}-0", _iso(created), "ticket", tid, "TICKET_CREATED_OR_UPDATED", "bench", json.dumps({"status": "Open"})))
+        updated = created
+        for step, after in enumerate(("In Progress", "Resolved"), start=1):
+            if rng.random() < 0.6:
+                break
+            updated = min(now, updated + timedelta(seconds=rng.randint(600, 3 * 86400)))
+            changes = {"status": {"before": status, "after": after}}
+            events.append((f"BENCH-{tid}-{step}", _iso(updated), "ticket", tid, "TICKET_BULK_UPDATED", "bench", json.dumps({"changes": changes})))
+            status = after
+        tickets.append(
+            (tid, f"BENCH-EML-{start + i}", _iso(created), _iso(updated), status, "Invoice", rng.choice(QUEUES), rng.choice(ASSIGNEES), "P2", "bench", "bench@example.com", "bench", "{}")
+        )
+        if len(tickets) >= 50_000:
+            _flush(cur, tickets, events)
+    _flush(cur, tickets, events)
+    c.commit()
+    c.close()
+
+
+def _flush(cur, tickets: list, events: list):
+    cur.executemany(
+        """
+        INSERT INTO tickets(ticket_id, email_id, created_at, updated_at, status, request_type, queue, assignee, priority, title, from_email, subject, payload_json)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        tickets,
+    )
+    cur.executemany(
+        "INSERT INTO audit_log(event_id, timestamp, entity_type, entity_id, action, actor_name, details_json) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        events,
+    )
+    tickets.clear()
+    events.clear()
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard snapshot and render timings")
+    parser.add_argument("--tickets", type=int, default=1_000_000)
+    parser.add_argument("--renders", type=int, default=20)
+    parser.add_argument("--writes", type=int, default=200, help="new tickets between incremental renders")
+    parser.add_argument("--db", default=None, help="scratch DB path (default: a new temp file)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    db.DB_PATH = args.db or os.path.join(tempfile.mkdtemp(prefix="finops-dash-"), "dash.db")
+    os.chdir(ROOT)
+    db.ensure_db()
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc).astimezone()
+
+    t0 = time.perf_counter()
+    seed(args.tickets, rng, now)
+    print(f"seeded {args.tickets} tickets in {time.perf_counter() - t0:.1f}s ({db.DB_PATH})")
+
+    cold = _timed(dashboard_metrics)
+    warm = [_timed(dashboard_metrics) for _ in range(args.renders)]
+    incremental = []
+    for r in range(5):
+        # Stamped now, so they land after the snapshot's marks like real writes.
+        seed(args.writes, rng, datetime.now(timezone.utc).astimezone(), start=1001 + args.tickets + r * args.writes, spread_days=0)
+        incremental.append(_timed(dashboard_metrics))
+        m = dashboard_metrics()
+        expected = args.tickets + (r + 1) * args.writes
+        assert m["tickets"] == expected, f"snapshot has {m['tickets']} tickets after batch {r + 1}, expected {expected}"
+
+    print(f"cold (full snapshot load): {cold:.0f} ms")
+    print(f"warm render:               p50 {statistics.median(warm):.1f} ms, max {max(warm):.1f} ms")
+    print(f"after {args.writes} new tickets:    p50 {statistics.median(incremental):.1f} ms, max {max(incremental):.1f} ms")
+    print(f"{m['tickets']} tickets, {m['open']} open, aging {m['aging']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core.db as db  # noqa: E402
+from core.data import load_json  # noqa: E402
+from core.inbox import inbox_rows  # noqa: E402
+from core.tickets_full import create_or_update_ticket, list_tickets, ticket_metrics  # noqa: E402
+
+
+# Simulates concurrent reviewers against the core service layer (the same calls the
+# Streamlit pages make): Inbox -> open in Approval -> edit -> Approve -> Ticket Queue.
+# Runs against a scratch database, never storage/demo.db. --sharding entity|hash
+# puts the scratch shards next to it and spreads the load-test emails over them.
+
+ACTIONS = ["inbox", "open_approval", "edit_field", "approve", "ticket_queue"]
+# SQL write statements issued per action, for throughput accounting.
+WRITES_PER_ACTION = {"open_approval": 1, "edit_field": 2, "approve": 4}
+
+
+def _use_db(path: str, storage: dict):
+    db.DB_PATH = path
+    db.STORAGE = storage
+
+
+def _email_id(session_id: int, i: int) -> str:
+    return f"LT-{session_id:03d}-{i:05d}"
+
+
+def _assign_entities(sessions: int, iterations: int, entities: int):
+    # Stand-in for core.shards.assign_emails: round-robin over synthetic entity codes.
+    rows = []
+    for s in range(sessions):
+        for i in range(iterations):
+            code = f"LT{(s * iterations + i) % entities:02d}"
+            rows.append((_email_id(s, i), f"entity_{code}", code))
+    c = db.conn()
+    c.executemany("INSERT OR REPLACE INTO email_shards(email_id, shard, entity_code) VALUES (?, ?, ?)", rows)
+    c.commit()
+    c.close()
+    for shard in {r[1] for r in rows}:
+        db.ensure_shard(shard)
+
+
+def _timed(samples: Dict[str, list], errors: Dict[str, Dict[str, int]], name: str, fn):
+    t0 = time.perf_counter()
+    try:
+        fn()
+    except sqlite3.Error as e:
+        # "database is locked" is the contention signal; anything else (e.g. a
+        # ticket-id collision between concurrent creators) is counted separately.
+        kind = "locked" if "locked" in str(e) else "other"
+        errors[name][kind] += 1
+        return False
+    samples[name].append(time.perf_counter() - t0)
+    return True
+
+
+def reviewer_session(session_id: int, iterations: int, think_ms: float, db_path: str, storage: dict, seed: int, writes_only: bool = False) -> dict:
+    _use_db(db_path, storage)
+    rng = random.Random(seed + session_id)
+    emails = load_json(os.path.join(ROOT, "data", "inbox_emails.json"))
+    agent_cache = load_json(os.path.join(ROOT, "data", "agent_cache.json"))
+
+    samples: Dict[str, list] = defaultdict(list)
+    errors: Dict[str, Dict[str, int]] = defaultdict(lambda: {"locked": 0, "other": 0})
+    writes = 0
+    actor = f"Load Reviewer {session_id}"
+
+    def pause():
+        if think_ms:
+            time.sleep(rng.uniform(0, think_ms) / 1000.0)
+
+    for i in range(iterations):
+        template = rng.choice(emails)
+        cached = agent_cache[template["email_id"]]
+        email_id = _email_id(session_id, i)
+        routing = cached["routing_suggestion"]
+        overrides = {"extraction.fields.currency": "USD"}
+
+        if not writes_only:
+            _timed(samples, errors, "inbox", lambda: inbox_rows(emails, agent_cache))
+            pause()
+
+        def open_approval():
+            db.get_review_state(email_id)
+            db.write_audit("email", email_id, "AGENT_LOADED", actor, {"source": "load_test"})
+
+        if _timed(samples, errors, "open_approval", open_approval):
+            writes += WRITES_PER_ACTION["open_approval"]
+        pause()
+
+        def edit_field():
+            db.write_audit("email", email_id, "FIELD_EDITED", actor, {"field_path": "extraction.fields.currency", "before": None, "after": "USD"})
+            db.upsert_review_state(email_id, "PENDING_APPROVAL", overrides)
+
+        if _timed(samples, errors, "edit_field", edit_field):
+            writes += WRITES_PER_ACTION["edit_field"]
+        pause()
+
+        def approve():
+            db.upsert_review_state(email_id, "TICKETED", overrides)
+            db.write_audit("email", email_id, "APPROVED", actor, {})
+            t_id = create_or_update_ticket(
+                email_id=email_id,
+                status="Open",
+                title=f"{cached['classification']['request_type']}: load test",
+                request_type=cached["classification"]["request_type"],
+                queue=routing["queue"],
+                assignee=routing["assignee"],
+                priority=routing["priority"],
+                from_email=template["from"]["email"],
+                subject=template["subject"],
+                payload={"extraction": cached["extraction"]},
+            )
+            db.write_audit("ticket", t_id, "TICKET_CREATED_OR_UPDATED", actor, {"status": "Open"})
+
+        if _timed(samples, errors, "approve", approve):
+            writes += WRITES_PER_ACTION["approve"]
+        pause()
+
+        def ticket_queue():
+            ticket_metrics()
+            list_tickets({"status": "All", "limit": 200})
+
+        if not writes_only:
+            _timed(samples, errors, "ticket_queue", ticket_queue)
+            pause()
+
+    return {"samples": dict(samples), "errors": {k: dict(v) for k, v in errors.items()}, "writes": writes}
+
+
+def _pct(xs: List[float], p: int) -> float:
+    if len(xs) < 2:
+        return xs[0] if xs else float("nan")
+    return statistics.quantiles(xs, n=100, method="inclusive")[p - 1]
+
+
+def report(results: List[dict], wall_s: float, sessions: int, mode: str, storage: dict):
+    samples: Dict[str, list] = defaultdict(list)
+    errors: Dict[str, Dict[str, int]] = defaultdict(lambda: {"locked": 0, "other": 0})
+    writes = 0
+    for r in results:
+        for k, v in r["samples"].items():
+            samples[k].extend(v)
+        for k, v in r["errors"].items():
+            errors[k]["locked"] += v["locked"]
+            errors[k]["other"] += v["other"]
+        writes += r["writes"]
+
+    print(f"\n{sessions} concurrent reviewer sessions ({mode}, sharding {storage['sharding']}), wall time {wall_s:.2f}s")
+    print(f"{'action':<15}{'ok':>7}{'locked':>8}{'lock %':>8}{'other':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in ACTIONS:
+        if name not in samples and name not in errors:
+            continue
+        xs = samples.get(name, [])
+        locked = errors[name]["locked"]
+        attempts = len(xs) + locked + errors[name]["other"]
+        lock_pct = 100.0 * locked / attempts if attempts else 0.0
+        print(
+            f"{name:<15}{len(xs):>7}{locked:>8}{lock_pct:>7.2f}%{errors[name]['other']:>7}"
+            f"{_pct(xs, 50) * 1000:>10.2f}{_pct(xs, 95) * 1000:>10.2f}{_pct(xs, 99) * 1000:>10.2f}"
+        )
+    print(f"DB write throughput: {writes / wall_s:.1f} committed writes/s ({writes} total)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent reviewer load test against the core service layer")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=25, help="emails reviewed per session")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="max random pause between actions")
+    parser.add_argument("--db", default=None, help="scratch DB path (default: a new temp file)")
+    parser.add_argument("--sharding", choices=["off", "entity", "hash"], default="off")
+    parser.add_argument("--entities", type=int, default=4, help="entity shards for --sharding entity; hash shards for hash")
+    parser.add_argument("--writes-only", action="store_true", help="skip the inbox and ticket queue reads")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="also dump raw per-action samples as JSON")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="finops-load-"), "load.db")
+    storage = {
+        "sharding": args.sharding,
+        "shard_dir": os.path.join(os.path.dirname(db_path), "shards"),
+        "hash_shards": args.entities,
+    }
+    os.chdir(ROOT)
+    _use_db(db_path, storage)
+    db.ensure_db()
+    if args.sharding == "entity":
+        _assign_entities(args.sessions, args.iterations, args.entities)
+
+    pool_cls = ThreadPoolExecutor if args.mode == "thread" else ProcessPoolExecutor
+    t0 = time.perf_counter()
+    with pool_cls(max_workers=args.sessions) as pool:
+        futures = [
+            pool.submit(reviewer_session, s, args.iterations, args.think_ms, db_path, storage, args.seed, args.writes_only)
+            for s in range(args.sessions)
+        ]
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - t0
+
+    print(f"scratch DB: {db_path}")
+    report(results, wall, args.sessions, args.mode, storage)
+    if args.json:
+        print(json.dumps([r["samples"] for r in results]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core.email_store as email_store  # noqa: E402
+from core.data import index_emails, load_json  # noqa: E402
+
+
+# Retained memory of the inbox as nested dicts (inbox_emails.json + agent_cache.json,
+# as app.py held them before core.email_store) versus the compact store, on a
+# synthetic inbox cloned from the demo data. Scratch files only, never data/.
+
+
+def synthesize(n: int, out_dir: str, seed: int):
+    rng = random.Random(seed)
+    emails = load_json(os.path.join(ROOT, "data", "inbox_emails.json"))
+    agent_cache = load_json(os.path.join(ROOT, "data", "agent_cache.json"))
+    big_emails, big_cache = [], {}
+    for i in range(n):
+        template = rng.choice(emails)
+        email_id = f"MB-{i:07d}"
+        e = json.loads(json.dumps(template))
+        e["email_id"] = email_id
+        e["subject"] = f"{template['subject']} #{i}"
+        e["body"] = f"{template['body']}\n\nRef {email_id}"
+        big_emails.append(e)
+        big_cache[email_id] = agent_cache[template["email_id"]]
+    inbox_path = os.path.join(out_dir, "inbox_emails.json")
+    cache_path = os.path.join(out_dir, "agent_cache.json")
+    with open(inbox_path, "w", encoding="utf-8") as f:
+        json.dump(big_emails, f, ensure_ascii=False)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(big_cache, f, ensure_ascii=False)
+    return inbox_path, cache_path
+
+
+def measure(fn):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    kept = fn()
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return kept, current, peak, elapsed
+
+
+def _mb(n: int) -> str:
+    return f"{n / 1e6:8.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inbox memory: nested dicts vs core.email_store")
+    parser.add_argument("--emails", type=int, default=100_000)
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions for the per-process projection")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="finops-mem-")
+    email_store.STORE_DIR = os.path.join(tmp, "email_store")
+    inbox_path, cache_path = synthesize(args.emails, tmp, args.seed)
+    print(f"{args.emails} emails, inbox {_mb(os.path.getsize(inbox_path))}, agent cache {_mb(os.path.getsize(cache_path))}")
+
+    def dicts():
+        emails = load_json(inbox_path)
+        return emails, index_emails(emails), load_json(cache_path)
+
+    def emails_only():
+        emails = load_json(inbox_path)
+        return emails, index_emails(emails)
+
+    kept, dict_bytes, dict_peak, dict_s = measure(dicts)
+    del kept
+    # st.cache_data hands every session its own copy of the emails list.
+    kept, per_session, _, _ = measure(emails_only)
+    del kept
+    store, store_bytes, store_peak, store_s = measure(lambda: email_store.build_email_store(inbox_path, cache_path))
+
+    ids = [r.email_id for r in store["records"]]
+    t0 = time.perf_counter()
+    for email_id in random.Random(args.seed).sample(ids, min(1000, len(ids))):
+        email_store.load_email(store, email_id)
+        email_store.load_agent_entry(store, email_id)
+    open_us = (time.perf_counter() - t0) / min(1000, len(ids)) * 1e6
+
+    print(f"{'':<22}{'retained':>11}{'peak':>11}{'s traced':>10}")
+    print(f"{'nested dicts':<22}{_mb(dict_bytes):>11}{_mb(dict_peak):>11}{dict_s:>10.2f}")
+    print(f"{'compact store':<22}{_mb(store_bytes):>11}{_mb(store_peak):>11}{store_s:>10.2f}")
+    print(f"reduction: {dict_bytes / store_bytes:.1f}x retained; blob file {_mb(os.path.getsize(store['path']))} on disk")
+    print(
+        f"{args.sessions} sessions in one process: dicts {_mb(dict_bytes + (args.sessions - 1) * per_session)}, "
+        f"store {_mb(store_bytes)} (shared)"
+    )
+    print(f"open one email + agent entry on demand: {open_us:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
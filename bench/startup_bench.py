@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app resolves data/, storage/ and config.toml against the working
+# directory, so each run works in a scratch copy: sessions write audit rows and
+# intake may auto-approve (core.stp), which must never touch storage/demo.db.
+
+
+def scratch_workdir() -> str:
+    work = tempfile.mkdtemp(prefix="finops-startup-")
+    shutil.copytree(os.path.join(ROOT, "data"), os.path.join(work, "data"))
+    if os.path.exists(os.path.join(ROOT, "config.toml")):
+        shutil.copy(os.path.join(ROOT, "config.toml"), work)
+    # Start from the demo's current state so DDL and intake cost what they do live.
+    os.makedirs(os.path.join(work, "storage"))
+    if os.path.exists(os.path.join(ROOT, "storage", "demo.db")):
+        shutil.copy(os.path.join(ROOT, "storage", "demo.db"), os.path.join(work, "storage"))
+    if os.path.isdir(os.path.join(ROOT, "storage", "shards")):
+        shutil.copytree(os.path.join(ROOT, "storage", "shards"), os.path.join(work, "storage", "shards"))
+    return work
+
+
+def _run_session(page: str) -> float:
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.session_state["auth"] = True
+    at.session_state["page"] = page
+    t0 = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - t0
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return elapsed
+
+
+def child(page: str, warm_runs: int, workdir: str):
+    # One fresh interpreter: the first session pays imports, DDL and JSON loads;
+    # later sessions in the same process should hit st.cache_resource/cache_data.
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    t0 = time.perf_counter()
+    import streamlit.testing.v1  # noqa: F401
+
+    framework = time.perf_counter() - t0
+    cold = _run_session(page)
+    warm = [_run_session(page) for _ in range(warm_runs)]
+    print(json.dumps({"framework_import_s": framework, "cold_s": cold, "warm_s": warm}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold vs warm start timings for app.py via Streamlit AppTest")
+    parser.add_argument("--page", default="Inbox", choices=["Inbox", "Approval", "Ticket Queue"])
+    parser.add_argument("--processes", type=int, default=3, help="fresh interpreters (cold samples)")
+    parser.add_argument("--warm-runs", type=int, default=5, help="sessions per interpreter after the first")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.page, args.warm_runs, args.workdir)
+        return
+
+    workdir = scratch_workdir()
+    print(f"scratch copy: {workdir}")
+    cold, warm, framework = [], [], []
+    for _ in range(args.processes):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--page", args.page, "--warm-runs", str(args.warm_runs), "--workdir", workdir],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        framework.append(r["framework_import_s"])
+        cold.append(r["cold_s"])
+        warm.extend(r["warm_s"])
+
+    def ms(xs):
+        return f"median {statistics.median(xs) * 1000:8.1f} ms   min {min(xs) * 1000:8.1f} ms   n={len(xs)}"
+
+    print(f"page: {args.page}")
+    print(f"streamlit import : {ms(framework)}")
+    print(f"cold first run   : {ms(cold)}")
+    print(f"warm rerun       : {ms(warm)}")
+
+
+if __name__ == "__main__":
+    main()
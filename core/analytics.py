@@ -0,0 +1,389 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import core.db as db
+from core.audit import archived_months, partition_path
+from core.db import shard_conn, shard_names
+from core.tickets_full import TICKET_STATUSES
+
+
+# Backlog, aging, throughput and time-in-status for the Dashboard page.
+#
+# A million tickets is too many to GROUP BY on every render, so each process
+# keeps one columnar snapshot (numpy arrays with one slot per ticket, see
+# _slots) and refreshes it incrementally: SQL returns only tickets whose updated_at is
+# at or after the last one seen (idx_tickets_updated_at) and ticket status
+# transitions newer than the last audit event seen (idx_audit_timestamp), per
+# shard. All the aggregation on a render is vectorized over the arrays.
+#
+# Time in status comes from the audit log: TICKET_CREATED_OR_UPDATED
+# {"status"} and TICKET_BULK_UPDATED {"changes": {"status": {"after"}}}.
+# The first load also replays the months core.audit.archive_month moved into
+# archive partitions; once loaded, archiving changes nothing the snapshot counts.
+#
+# The first load scans every ticket (seconds at a million), so the Dashboard
+# starts it in the background on its first visit (warm_snapshot) and shows a
+# loading state until snapshot_ready().
+
+CLOSED_STATUS = "Resolved"
+STATUS_ACTIONS = ("TICKET_CREATED_OR_UPDATED", "TICKET_BULK_UPDATED")
+AGING_BUCKETS = ("0–1d", "1–3d", "3–7d", ">7d")
+_AGING_EDGES = np.array([1, 3, 7]) * 86400
+_DAY = 86400
+# Writes stamp updated_at (core.db.now_iso) before they commit; by this many
+# seconds later every write stamped with a given second has committed.
+_SETTLE_SECONDS = 5
+
+_lock = threading.Lock()
+_snapshots: Dict[str, dict] = {}
+_warmers: Dict[str, threading.Thread] = {}
+
+_COLUMNS = {
+    "present": (np.bool_, False),
+    "created": (np.int64, 0),
+    "status": (np.int32, -1),
+    "queue": (np.int32, -1),
+    "assignee": (np.int32, -1),
+    # status as of the latest audit transition, and since when (-1: no transition yet)
+    "tis_status": (np.int32, -1),
+    "tis_since": (np.int64, -1),
+}
+
+
+def _new_snapshot() -> dict:
+    return {
+        "size": 0,
+        **{name: np.zeros(0, dtype) for name, (dtype, _) in _COLUMNS.items()},
+        # category labels; codes are positions in these lists
+        "labels": {"status": list(TICKET_STATUSES), "queue": [], "assignee": [], "tag": []},
+        "codes": {"status": {s: i for i, s in enumerate(TICKET_STATUSES)}, "queue": {}, "assignee": {}, "tag": {}},
+        "blocks": {},  # (tag code << 32 | number >> _BLOCK_BITS) -> block of slots
+        "tickets_mark": {},  # shard -> last updated_at seen
+        "audit_mark": {},  # shard -> (last timestamp seen, event_ids seen at it)
+        "tis_seconds": np.zeros(len(TICKET_STATUSES)),
+        "tis_count": np.zeros(len(TICKET_STATUSES), np.int64),
+        "resolved_days": Counter(),  # UTC day number -> transitions to CLOSED_STATUS
+        "refresh_ms": 0.0,
+        "loaded": False,
+    }
+
+
+def _grow(snap: dict, n: int):
+    if n <= snap["size"]:
+        return
+    size = max(n, 2 * snap["size"], 1024)
+    for name, (dtype, fill) in _COLUMNS.items():
+        old = snap[name]
+        snap[name] = np.concatenate([old, np.full(size - len(old), fill, dtype)])
+    snap["size"] = size
+
+
+def _encode(snap: dict, kind: str, values: tuple) -> np.ndarray:
+    # Category codes via hashing (pd.factorize), not sorting; new labels are appended.
+    inverse, uniques = pd.factorize(np.asarray(values, dtype=object))
+    codes = snap["codes"][kind]
+    labels = snap["labels"][kind]
+    lut = np.empty(len(uniques), np.int32)
+    for i, u in enumerate(uniques):
+        if u not in codes:
+            codes[u] = len(labels)
+            labels.append(u)
+        lut[i] = codes[u]
+    if kind == "status" and len(labels) > len(snap["tis_seconds"]):
+        extra = len(labels) - len(snap["tis_seconds"])
+        snap["tis_seconds"] = np.concatenate([snap["tis_seconds"], np.zeros(extra)])
+        snap["tis_count"] = np.concatenate([snap["tis_count"], np.zeros(extra, np.int64)])
+    return lut[inverse]
+
+
+# Parsing happens in SQLite: the shard tag and number of FIN-<n> / FIN-<tag>-<n>
+# (number 0 when there is none) and epoch seconds from the ISO timestamps,
+# offsets included.
+_ID_REST_SQL = "substr({col}, instr({col}, '-') + 1)"
+_TICKET_TAG_SQL = "substr({rest}, 1, max(instr({rest}, '-') - 1, 0))"
+_TICKET_NUMBER_SQL = "CAST(substr({rest}, instr({rest}, '-') + 1) AS INTEGER)"
+_EPOCH_SQL = "CAST(strftime('%s', {col}) AS INTEGER)"
+_BLOCK_BITS = 16
+
+
+def _id_columns(col: str) -> str:
+    rest = _ID_REST_SQL.format(col=col)
+    return f"{_TICKET_TAG_SQL.format(rest=rest)}, {_TICKET_NUMBER_SQL.format(rest=rest)}"
+
+
+def _slots(snap: dict, tags: np.ndarray, nums: np.ndarray) -> np.ndarray:
+    # Each shard numbers its own tickets, so a slot is the ticket's number
+    # within a block of 2**16 slots owned by (tag, number >> 16).
+    keys = (_encode(snap, "tag", tags).astype(np.int64) << 32) | (nums >> _BLOCK_BITS)
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    blocks = snap["blocks"]
+    base = np.empty(len(uniq), np.int64)
+    for i, k in enumerate(uniq.tolist()):
+        base[i] = blocks.setdefault(k, len(blocks)) << _BLOCK_BITS
+    _grow(snap, len(blocks) << _BLOCK_BITS)
+    return base[inverse] + (nums & ((1 << _BLOCK_BITS) - 1))
+
+
+def _refresh_tickets(snap: dict, cur, shard: str):
+    mark = snap["tickets_mark"].get(shard)
+    # While the mark's second is recent, more writes stamped with it may still
+    # commit, so those rows are re-read (idempotent); after that only newer
+    # rows are. The first load is a plain table scan.
+    if not mark:
+        where = ""
+    elif _settled(mark):
+        where = "WHERE updated_at > ?"
+    else:
+        where = "WHERE updated_at >= ?"
+    cur.execute(
+        f"""
+        SELECT {_id_columns("ticket_id")}, {_EPOCH_SQL.format(col="created_at")},
+               updated_at, status, queue, assignee
+        FROM tickets
+        {where}
+        """,
+        (mark,) if mark else (),
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return
+    tags, nums, created, updated, status, queue, assignee = zip(*rows)
+    nums = np.array(nums, np.int64)
+    ok = nums > 0
+    if not ok.any():
+        return
+    n = _slots(snap, np.asarray(tags, dtype=object)[ok], nums[ok])
+    snap["present"][n] = True
+    snap["created"][n] = np.array(created, np.int64)[ok]
+    snap["status"][n] = _encode(snap, "status", status)[ok]
+    snap["queue"][n] = _encode(snap, "queue", queue)[ok]
+    snap["assignee"][n] = _encode(snap, "assignee", assignee)[ok]
+    snap["tickets_mark"][shard] = max(updated)
+
+
+def _settled(stamp: str) -> bool:
+    cutoff = datetime.now(timezone.utc).astimezone() - timedelta(seconds=_SETTLE_SECONDS)
+    return stamp < cutoff.isoformat(timespec="seconds")
+
+
+_TRANSITIONS_SQL = f"""
+    SELECT {_id_columns("entity_id")}, {_EPOCH_SQL.format(col="timestamp")}, timestamp, event_id,
+           COALESCE(json_extract(details_json, '$.changes.status.after'), json_extract(details_json, '$.status'))
+    FROM audit_log
+    WHERE +entity_type='ticket' AND action IN ({",".join("?" * len(STATUS_ACTIONS))})
+"""
+
+
+def _refresh_transitions(snap: dict, cur, shard: str):
+    # The mark is the last timestamp seen and the events seen at it: events
+    # stamped with that second can still commit until it settles, and each
+    # transition must be counted exactly once.
+    mark_ts, seen = snap["audit_mark"].get(shard, ("", set()))
+    if mark_ts:
+        # +entity_type keeps the planner on idx_audit_timestamp rather than
+        # scanning every ticket's timeline.
+        op = ">" if _settled(mark_ts) else ">="
+        cur.execute(f"{_TRANSITIONS_SQL} AND timestamp {op} ?", (*STATUS_ACTIONS, mark_ts))
+    else:
+        # Archived months are whole months older than anything left in the
+        # hot audit_log, so replaying them first keeps each timeline in order.
+        for month in archived_months(shard):
+            p = sqlite3.connect(partition_path(month, shard))
+            _apply_transitions(snap, p.execute(_TRANSITIONS_SQL, STATUS_ACTIONS).fetchall())
+            p.close()
+        cur.execute(_TRANSITIONS_SQL, STATUS_ACTIONS)
+    rows = [r for r in cur.fetchall() if r[3] != mark_ts or r[4] not in seen]
+    if not rows:
+        return
+    last_ts = max(r[3] for r in rows)
+    at_last = {r[4] for r in rows if r[3] == last_ts}
+    snap["audit_mark"][shard] = (last_ts, (seen | at_last) if last_ts == mark_ts else at_last)
+    _apply_transitions(snap, rows)
+
+
+def _apply_transitions(snap: dict, rows: List[tuple]):
+    if not rows:
+        return
+    tags, nums, ts, _, _, status = zip(*rows)
+    nums, ts, status = np.array(nums, np.int64), np.array(ts, np.int64), np.asarray(status, dtype=object)
+    ok = (nums > 0) & pd.notna(status)
+    if not ok.any():
+        return
+    ts, status = ts[ok], _encode(snap, "status", status[ok])
+    # `nums` are slots from here on.
+    nums = _slots(snap, np.asarray(tags, dtype=object)[ok], nums[ok])
+    # Group by ticket, time-ordered within a ticket (lexsort is stable, so
+    # same-second events keep their insertion order).
+    order = np.lexsort((ts, nums))
+    nums, ts, status = nums[order], ts[order], status[order]
+
+    # A transition only counts when the status actually changes; re-saves keep
+    # the interval open.
+    first = np.r_[True, nums[1:] != nums[:-1]]
+    prev_status = np.where(first, snap["tis_status"][nums], np.r_[-1, status[:-1]])
+    keep = status != prev_status
+    nums, ts, status = nums[keep], ts[keep], status[keep]
+    if not len(nums):
+        return
+    first = np.r_[True, nums[1:] != nums[:-1]]
+    prev_status = np.where(first, snap["tis_status"][nums], np.r_[-1, status[:-1]])
+    prev_ts = np.where(first, snap["tis_since"][nums], np.r_[-1, ts[:-1]])
+
+    closed = (prev_status >= 0) & (prev_ts >= 0)
+    k = len(snap["labels"]["status"])
+    snap["tis_seconds"] += np.bincount(prev_status[closed], weights=np.maximum(ts - prev_ts, 0)[closed], minlength=k)
+    snap["tis_count"] += np.bincount(prev_status[closed], minlength=k)
+
+    last = np.r_[nums[1:] != nums[:-1], True]
+    snap["tis_status"][nums[last]] = status[last]
+    snap["tis_since"][nums[last]] = ts[last]
+
+    resolved = status == snap["codes"]["status"][CLOSED_STATUS]
+    days, counts = np.unique(ts[resolved] // _DAY, return_counts=True)
+    snap["resolved_days"].update(dict(zip(days.tolist(), counts.tolist())))
+
+
+def refresh_snapshot() -> dict:
+    # One snapshot per database, shared by every session in the process.
+    with _lock:
+        snap = _snapshots.get(db.DB_PATH)
+        if snap is None:
+            snap = _snapshots[db.DB_PATH] = _new_snapshot()
+        t0 = time.perf_counter()
+        for shard in shard_names():
+            c = shard_conn(shard)
+            cur = c.cursor()
+            _refresh_tickets(snap, cur, shard)
+            _refresh_transitions(snap, cur, shard)
+            c.close()
+        snap["refresh_ms"] = (time.perf_counter() - t0) * 1000
+        snap["loaded"] = True
+        return snap
+
+
+def warm_snapshot():
+    # Starts the first (full) load in a background thread, once per database
+    # (again if a previous attempt died).
+    path = db.DB_PATH
+    with _lock:
+        running = path in _warmers and _warmers[path].is_alive()
+        if running or _snapshots.get(path, {}).get("loaded"):
+            return
+        _warmers[path] = t = threading.Thread(target=refresh_snapshot, name="dashboard-snapshot", daemon=True)
+    t.start()
+
+
+def snapshot_ready() -> bool:
+    snap = _snapshots.get(db.DB_PATH)
+    return bool(snap and snap["loaded"])
+
+
+def dashboard_metrics(days: int = 14, now: Optional[datetime] = None) -> Dict:
+    snap = refresh_snapshot()
+    t0 = time.perf_counter()
+    now_s = int((now or datetime.now(timezone.utc)).timestamp())
+    labels = snap["labels"]
+    n_status, n_queue, n_assignee = len(labels["status"]), len(labels["queue"]), len(labels["assignee"])
+    closed_code = snap["codes"]["status"][CLOSED_STATUS]
+
+    present = snap["present"]
+    open_ = present & (snap["status"] != closed_code)
+    status, queue, assignee = snap["status"][open_], snap["queue"][open_], snap["assignee"][open_]
+    age = now_s - snap["created"][open_]
+    bucket = np.searchsorted(_AGING_EDGES, age, side="right")
+    n_buckets = len(AGING_BUCKETS)
+
+    by_queue_status = np.bincount(queue * n_status + status, minlength=n_queue * n_status).reshape(n_queue, n_status)
+    by_queue_age = np.bincount(queue * n_buckets + bucket, minlength=n_queue * n_buckets).reshape(n_queue, n_buckets)
+    open_statuses = [i for i in range(n_status) if i != closed_code]
+    backlog_by_queue = [
+        {
+            "queue": labels["queue"][q],
+            "open": int(by_queue_status[q].sum()),
+            **{labels["status"][s]: int(by_queue_status[q, s]) for s in open_statuses},
+            **{b: int(by_queue_age[q, i]) for i, b in enumerate(AGING_BUCKETS)},
+        }
+        for q in np.argsort(-by_queue_status.sum(axis=1))
+        if by_queue_status[q].sum()
+    ]
+
+    per_assignee = np.bincount(assignee, minlength=n_assignee)
+    age_days = np.bincount(assignee, weights=age, minlength=n_assignee) / _DAY
+    over_7d = np.bincount(assignee[bucket == n_buckets - 1], minlength=n_assignee)
+    backlog_by_assignee = [
+        {
+            "assignee": labels["assignee"][a],
+            "open": int(per_assignee[a]),
+            "avg_age_days": round(float(age_days[a] / per_assignee[a]), 1),
+            ">7d": int(over_7d[a]),
+        }
+        for a in np.argsort(-per_assignee)
+        if per_assignee[a]
+    ]
+
+    today = now_s // _DAY
+    start = today - days + 1
+    created_day = snap["created"][present] // _DAY
+    recent = created_day >= start
+    created_per_day = np.bincount(created_day[recent] - start, minlength=days)[:days]
+    throughput = [
+        {
+            "day": datetime.fromtimestamp((start + i) * _DAY, timezone.utc).strftime("%Y-%m-%d"),
+            "created": int(created_per_day[i]),
+            "resolved": int(snap["resolved_days"].get(start + i, 0)),
+        }
+        for i in range(days)
+    ]
+
+    # Completed intervals from the transitions, plus how long open tickets
+    # have been in their current status.
+    tis = snap["tis_status"][open_]
+    since = snap["tis_since"][open_]
+    known = tis >= 0
+    current_n = np.bincount(tis[known], minlength=n_status)
+    current_s = np.bincount(tis[known], weights=(now_s - since[known]), minlength=n_status)
+    time_in_status = [
+        {
+            "status": labels["status"][s],
+            "transitions": int(snap["tis_count"][s]),
+            "avg_hours": round(float(snap["tis_seconds"][s] / snap["tis_count"][s] / 3600), 1) if snap["tis_count"][s] else None,
+            "open_now": int(current_n[s]),
+            "open_avg_hours": round(float(current_s[s] / current_n[s] / 3600), 1) if current_n[s] else None,
+        }
+        for s in range(n_status)
+        if snap["tis_count"][s] or current_n[s]
+    ]
+
+    aging = np.bincount(bucket, minlength=n_buckets)
+    return {
+        "tickets": int(present.sum()),
+        "open": int(open_.sum()),
+        "aging": {b: int(aging[i]) for i, b in enumerate(AGING_BUCKETS)},
+        "backlog_by_queue": backlog_by_queue,
+        "backlog_by_assignee": backlog_by_assignee,
+        "throughput": throughput,
+        "time_in_status": time_in_status,
+        "refresh_ms": snap["refresh_ms"],
+        "aggregate_ms": (time.perf_counter() - t0) * 1000,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Ticket backlog, aging and throughput")
+    parser.add_argument("--days", type=int, default=14)
+    args = parser.parse_args(argv)
+    db.ensure_db()
+    print(json.dumps(dashboard_metrics(days=args.days), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import argparse
+import glob
+import heapq
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from core.config import get_section
+from core.db import AUDIT_LOG_DDL, AUDIT_TIMELINE_INDEX_DDL, HOME_SHARD, _entity_page, ensure_db, shard_conn, shard_names
+
+
+# Reviewer edit events that are only interesting in aggregate once they age out.
+COMPACTABLE_ACTIONS = ("FIELD_EDITED", "ROUTING_CHANGED", "DRAFT_EDITED")
+COMPACTED_ACTION = "EDITS_COMPACTED"
+
+
+def _settings() -> dict:
+    cfg = get_section("audit")
+    return {
+        "compact_after_days": int(cfg.get("compact_after_days", 30)),
+        "hot_months": int(cfg.get("hot_months", 3)),
+        "archive_dir": cfg.get("archive_dir", os.path.join("storage", "audit_archive")),
+    }
+
+
+def _cutoff_iso(days: int, now: Optional[datetime] = None) -> str:
+    now = now or datetime.now(timezone.utc).astimezone()
+    return (now - timedelta(days=days)).isoformat(timespec="seconds")
+
+
+def _month_floor(months_back: int, now: Optional[datetime] = None) -> str:
+    now = now or datetime.now(timezone.utc).astimezone()
+    y, m = now.year, now.month - months_back
+    while m <= 0:
+        y, m = y - 1, m + 12
+    return f"{y:04d}-{m:02d}"
+
+
+def _next_month(month: str) -> str:
+    y, m = int(month[:4]), int(month[5:7])
+    return f"{y + 1:04d}-01" if m == 12 else f"{y:04d}-{m + 1:02d}"
+
+
+def _edit_key(action: str, details: dict) -> str:
+    if action == "FIELD_EDITED":
+        return details.get("field_path", "?")
+    if action == "ROUTING_CHANGED":
+        return f"routing.{details.get('field', '?')}"
+    return f"draft_response.{details.get('field', '?')}"
+
+
+def _summarize(rows: List[tuple]) -> tuple:
+    # rows: (event_id, timestamp, entity_type, entity_id, action, actor_name, details_json), oldest first
+    changes: Dict[str, dict] = {}
+    actors = []
+    for _, _, _, _, action, actor, details_json in rows:
+        details = json.loads(details_json)
+        key = _edit_key(action, details)
+        entry = changes.setdefault(key, {"before": details.get("before"), "after": None, "edits": 0})
+        entry["after"] = details.get("after")
+        entry["edits"] += 1
+        if actor not in actors:
+            actors.append(actor)
+
+    first, last = rows[0], rows[-1]
+    details = {
+        "from": first[1],
+        "to": last[1],
+        "event_count": len(rows),
+        "actors": actors,
+        "changes": changes,
+    }
+    return (f"{last[0]}-C", last[1], last[2], last[3], COMPACTED_ACTION, actors[-1], json.dumps(details, ensure_ascii=False))
+
+
+def compact_edits(older_than_days: Optional[int] = None) -> Dict[str, int]:
+    days = _settings()["compact_after_days"] if older_than_days is None else older_than_days
+    total = {"events_removed": 0, "summaries_written": 0}
+    for shard in shard_names():
+        for k, v in _compact_shard(shard, _cutoff_iso(days)).items():
+            total[k] += v
+    return total
+
+
+def _compact_shard(shard: str, cutoff: str) -> Dict[str, int]:
+    marks = ",".join("?" * len(COMPACTABLE_ACTIONS))
+
+    c = shard_conn(shard)
+    cur = c.cursor()
+    removed = 0
+    summaries = 0
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            f"""
+            SELECT event_id, timestamp, entity_type, entity_id, action, actor_name, details_json
+            FROM audit_log
+            WHERE timestamp < ? AND action IN ({marks})
+            ORDER BY entity_type, entity_id, timestamp, event_id
+            """,
+            (cutoff, *COMPACTABLE_ACTIONS),
+        )
+
+        group: List[tuple] = []
+
+        def flush():
+            nonlocal removed, summaries
+            if not group:
+                return
+            c.executemany("DELETE FROM audit_log WHERE event_id=?", [(r[0],) for r in group])
+            c.execute(
+                """
+                INSERT OR REPLACE INTO audit_log(event_id, timestamp, entity_type, entity_id, action, actor_name, details_json)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                _summarize(group),
+            )
+            removed += len(group)
+            summaries += 1
+            group.clear()
+
+        for row in cur.fetchall():
+            # one summary per entity per day keeps the timeline's shape
+            if group and (group[-1][2], group[-1][3], group[-1][1][:10]) != (row[2], row[3], row[1][:10]):
+                flush()
+            group.append(row)
+        flush()
+        c.commit()
+    except Exception:
+        c.rollback()
+        raise
+    finally:
+        c.close()
+    return {"events_removed": removed, "summaries_written": summaries}
+
+
+def _archive_dir(shard: str = HOME_SHARD) -> str:
+    # Each storage shard archives into its own subdirectory.
+    root = _settings()["archive_dir"]
+    return root if shard == HOME_SHARD else os.path.join(root, shard)
+
+
+def partition_path(month: str, shard: str = HOME_SHARD) -> str:
+    return os.path.join(_archive_dir(shard), f"audit_{month.replace('-', '_')}.db")
+
+
+def _ensure_partition(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    p = sqlite3.connect(path)
+    p.execute(AUDIT_LOG_DDL)
+    p.execute(AUDIT_TIMELINE_INDEX_DDL)
+    p.commit()
+    p.close()
+
+
+def archive_month(month: str, shard: str = HOME_SHARD) -> int:
+    # Partitions are append-only: rows are copied with INSERT OR IGNORE and then
+    # removed from the hot DB in the same transaction.
+    path = partition_path(month, shard)
+    _ensure_partition(path)
+    lo, hi = month, _next_month(month)
+
+    c = shard_conn(shard)
+    try:
+        c.execute("ATTACH DATABASE ? AS part", (path,))
+        cur = c.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            "INSERT OR IGNORE INTO part.audit_log SELECT * FROM main.audit_log WHERE timestamp >= ? AND timestamp < ?",
+            (lo, hi),
+        )
+        cur.execute("DELETE FROM main.audit_log WHERE timestamp >= ? AND timestamp < ?", (lo, hi))
+        moved = cur.rowcount
+        c.commit()
+        c.execute("DETACH DATABASE part")
+    except Exception:
+        c.rollback()
+        raise
+    finally:
+        c.close()
+    return moved
+
+
+def archived_months(shard: str = HOME_SHARD) -> List[str]:
+    paths = glob.glob(os.path.join(_archive_dir(shard), "audit_*.db"))
+    return sorted(os.path.basename(p)[6:13].replace("_", "-") for p in paths)
+
+
+def archived_page(entity_type: str, entity_id: str, limit: int, before: Optional[Tuple[str, str]] = None) -> List[dict]:
+    # The next `limit` archived events of one entity, newest first, in the
+    # shape and cursor order of core.db.get_history.
+    pages = []
+    for shard in shard_names():
+        page: List[dict] = []
+        for month in reversed(archived_months(shard)):
+            if len(page) >= limit:
+                break
+            if before and month > before[0][:7]:
+                continue
+            p = sqlite3.connect(partition_path(month, shard))
+            page += _entity_page(p.cursor(), entity_type, entity_id, limit - len(page), before)
+            p.close()
+        pages.append(page)
+    return list(islice(heapq.merge(*pages, key=lambda e: (e["timestamp"], e["event_id"]), reverse=True), limit))
+
+
+def archived_details(event_ids: List[str]) -> Dict[str, dict]:
+    out: Dict[str, dict] = {}
+    wanted = list(dict.fromkeys(event_ids))
+    for shard, month in [(s, m) for s in shard_names() for m in archived_months(s)]:
+        if not wanted:
+            break
+        p = sqlite3.connect(partition_path(month, shard))
+        marks = ",".join("?" * len(wanted))
+        rows = p.execute(f"SELECT event_id, details_json FROM audit_log WHERE event_id IN ({marks})", wanted).fetchall()
+        p.close()
+        out.update((r[0], json.loads(r[1])) for r in rows)
+        wanted = [e for e in wanted if e not in out]
+    return out
+
+
+def apply_retention(vacuum: bool = False) -> dict:
+    s = _settings()
+    result = {"compaction": compact_edits(s["compact_after_days"]), "archived": {}}
+
+    floor = _month_floor(s["hot_months"] - 1)
+    for shard in shard_names():
+        c = shard_conn(shard)
+        rows = c.execute(
+            "SELECT DISTINCT substr(timestamp, 1, 7) FROM audit_log WHERE timestamp < ? ORDER BY 1",
+            (floor,),
+        ).fetchall()
+        c.close()
+
+        for (month,) in rows:
+            result["archived"][month] = result["archived"].get(month, 0) + archive_month(month, shard)
+
+        if vacuum and rows:
+            c = shard_conn(shard)
+            c.execute("VACUUM")
+            c.close()
+    return result
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Audit log retention, compaction and archiving")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("retention", help="compact old edits and archive cold months (config.toml [audit])")
+    r.add_argument("--vacuum", action="store_true", help="reclaim space in the hot DB afterwards")
+    cp = sub.add_parser("compact", help="fold old edit events into summary events")
+    cp.add_argument("--days", type=int, default=None)
+    a = sub.add_parser("archive", help="move one month (YYYY-MM) to its archive partition")
+    a.add_argument("month")
+    a.add_argument("--shard", default=HOME_SHARD)
+    sub.add_parser("months", help="list archived months")
+    args = parser.parse_args(argv)
+
+    ensure_db()
+    if args.cmd == "retention":
+        print(json.dumps(apply_retention(vacuum=args.vacuum), indent=2))
+    elif args.cmd == "compact":
+        print(json.dumps(compact_edits(args.days), indent=2))
+    elif args.cmd == "archive":
+        print(f"{args.month}: {archive_month(args.month, args.shard)} events archived")
+    else:
+        for m in archived_months():
+            print(m)
+
+
+if __name__ == "__main__":
+    main()
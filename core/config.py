@@ -0,0 +1,18 @@
+import os
+import tomllib
+from functools import lru_cache
+
+
+CONFIG_PATH = "config.toml"
+
+
+@lru_cache(maxsize=1)
+def load_config() -> dict:
+    if not os.path.exists(CONFIG_PATH):
+        return {}
+    with open(CONFIG_PATH, "rb") as f:
+        return tomllib.load(f)
+
+
+def get_section(name: str) -> dict:
+    return load_config().get(name, {})
@@ -9,3 +9,18 @@ def load_json(path: str) -> Any:
 
 def index_emails(emails: List[Dict]) -> Dict[str, Dict]:
     return {e["email_id"]: e for e in emails}
+
+
+def build_routing_index(demo_users: Dict) -> Dict:
+    queues = demo_users["queues"]
+    queue_id_by_name = {q["display_name"]: q["queue_id"] for q in queues}
+    assignees_by_queue: Dict[str, List[str]] = {q["queue_id"]: [] for q in queues}
+    for a in demo_users["assignees"]:
+        for qid in a["queues"]:
+            assignees_by_queue.setdefault(qid, []).append(a["name"])
+    return {
+        "queue_names": [q["display_name"] for q in queues],
+        "queue_id_by_name": queue_id_by_name,
+        "queue_by_name": {q["display_name"]: q for q in queues},
+        "assignees_by_queue": assignees_by_queue,
+    }
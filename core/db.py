@@ -1,28 +1,22 @@
+import heapq
 import json
 import os
+import re
 import sqlite3
+import zlib
 from datetime import datetime, timezone
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 
+from core.config import get_section
 
-DB_PATH = os.path.join("storage", "demo.db")
-
-
-def now_iso() -> str:
-    return datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
 
+DB_PATH = os.path.join("storage", "demo.db")
 
-def conn():
-    os.makedirs("storage", exist_ok=True)
-    return sqlite3.connect(DB_PATH)
-
+# review_state.finalized_json holds {"format": ..., "overrides": {...}} (see core.overlay).
+REVIEW_STATE_FORMAT = "overrides-v1"
 
-def ensure_db():
-    c = conn()
-    cur = c.cursor()
 
-    cur.execute(
-        """
+AUDIT_LOG_DDL = """
         CREATE TABLE IF NOT EXISTS audit_log (
             event_id TEXT PRIMARY KEY,
             timestamp TEXT NOT NULL,
@@ -33,7 +27,189 @@ def ensure_db():
             details_json TEXT NOT NULL
         )
         """
-    )
+
+AUDIT_TIMELINE_INDEX_DDL = """
+        CREATE INDEX IF NOT EXISTS idx_audit_timeline
+        ON audit_log(entity_type, entity_id, timestamp, event_id, action, actor_name)
+        """
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
+
+
+def conn():
+    os.makedirs("storage", exist_ok=True)
+    return sqlite3.connect(DB_PATH)
+
+
+# --- Storage shards ---------------------------------------------------------
+# tickets, review_state, audit_log and stp_decisions can live in per-entity or hash-partitioned
+# SQLite files so reviewers of different entities do not share one writer lock.
+# The home DB (DB_PATH) is always a shard too: it holds everything when
+# [storage] sharding = "off" and anything without a shard assignment otherwise.
+# Home also keeps the shared email_threads table and the email -> shard map
+# (see core.shards). Ticket ids name the shard that issued
+# them (FIN-1001 home, FIN-ACME-1001 entity_ACME, FIN-H03-1001 hash_03), so
+# creating a ticket only writes to its own shard; ticket_directory lists just
+# the tickets a rebalance moved away from that shard.
+
+HOME_SHARD = "home"
+# Overrides [storage] in config.toml when set, like DB_PATH (bench/scratch DBs).
+STORAGE: Optional[dict] = None
+
+_ready_shards = set()
+# Entity codes keep only these characters (core.shards.entity_shard_name).
+_CODE_RE = re.compile(r"[^A-Za-z0-9]+")
+# (DB_PATH, "email"|"ticket", id) -> shard. Assignments only change during
+# core.shards.rebalance, which runs with the app and API stopped.
+_shard_of: Dict[tuple, str] = {}
+
+
+def storage_settings() -> dict:
+    cfg = STORAGE if STORAGE is not None else get_section("storage")
+    return {
+        "sharding": cfg.get("sharding", "off"),
+        "shard_dir": cfg.get("shard_dir", os.path.join("storage", "shards")),
+        "hash_shards": int(cfg.get("hash_shards", 4)),
+    }
+
+
+def sharding_on() -> bool:
+    return storage_settings()["sharding"] != "off"
+
+
+def hash_shard(key: str, n: Optional[int] = None) -> str:
+    n = n or storage_settings()["hash_shards"]
+    return f"hash_{zlib.crc32(key.encode('utf-8')) % n:02d}"
+
+
+def shard_path(name: str) -> str:
+    if name == HOME_SHARD:
+        return DB_PATH
+    return os.path.join(storage_settings()["shard_dir"], f"{name}.db")
+
+
+def ticket_prefix(shard: str) -> str:
+    if shard == HOME_SHARD:
+        return "FIN-"
+    if shard.startswith("hash_"):
+        return f"FIN-H{shard[len('hash_'):]}-"
+    return f"FIN-{shard[len('entity_'):]}-"
+
+
+def shard_from_ticket_id(ticket_id: str) -> Optional[str]:
+    # None when the id's shard tag is not one ticket_prefix() could have issued.
+    parts = ticket_id.split("-")
+    if len(parts) != 3:
+        return HOME_SHARD
+    tag = parts[1]
+    if not tag or _CODE_RE.sub("", tag).upper() != tag:
+        return None
+    if storage_settings()["sharding"] == "hash" and re.fullmatch(r"H\d+", tag):
+        return f"hash_{tag[1:]}"
+    return f"entity_{tag}"
+
+
+def _known_shard(name: Optional[str]) -> bool:
+    # Lookups only ever open shards that exist; creating one is for writes
+    # routed by email (shard_conn -> ensure_shard).
+    if name is None:
+        return False
+    if name == HOME_SHARD or shard_path(name) in _ready_shards or os.path.exists(shard_path(name)):
+        return True
+    c = conn()
+    row = c.execute("SELECT 1 FROM shard_registry WHERE name=?", (name,)).fetchone()
+    c.close()
+    return row is not None
+
+
+def shard_conn(name: str):
+    if name == HOME_SHARD:
+        return conn()
+    path = shard_path(name)
+    if path not in _ready_shards:
+        ensure_shard(name)
+    return sqlite3.connect(path)
+
+
+def shard_names() -> List[str]:
+    if not sharding_on():
+        return [HOME_SHARD]
+    c = conn()
+    rows = c.execute("SELECT name FROM shard_registry ORDER BY name").fetchall()
+    c.close()
+    return [HOME_SHARD] + [r[0] for r in rows if r[0] != HOME_SHARD]
+
+
+def email_shard(email_id: str) -> str:
+    # Emails are assigned at intake; unassigned ones (e.g. created through the
+    # API) fall back to a deterministic default so reads and writes agree.
+    mode = storage_settings()["sharding"]
+    if mode == "off":
+        return HOME_SHARD
+    key = (DB_PATH, "email", email_id)
+    if key in _shard_of:
+        return _shard_of[key]
+    c = conn()
+    row = c.execute("SELECT shard FROM email_shards WHERE email_id=?", (email_id,)).fetchone()
+    c.close()
+    if row:
+        _shard_of[key] = row[0]
+        return row[0]
+    return hash_shard(email_id) if mode == "hash" else HOME_SHARD
+
+
+def ticket_shard(ticket_id: str) -> Optional[str]:
+    # None when no existing shard can hold the ticket (treat as not found).
+    if not sharding_on():
+        return HOME_SHARD
+    key = (DB_PATH, "ticket", ticket_id)
+    if key in _shard_of:
+        return _shard_of[key]
+    c = conn()
+    row = c.execute("SELECT shard FROM ticket_directory WHERE ticket_id=?", (ticket_id,)).fetchone()
+    c.close()
+    shard = row[0] if row else shard_from_ticket_id(ticket_id)
+    if not _known_shard(shard):
+        return None
+    _shard_of[key] = shard
+    return shard
+
+
+def ticket_shards(ticket_ids: List[str]) -> Dict[str, Optional[str]]:
+    # Batched ticket_shard() for bulk operations.
+    if not sharding_on():
+        return {t: HOME_SHARD for t in ticket_ids}
+    out = {t: shard_from_ticket_id(t) for t in ticket_ids}
+    c = conn()
+    for i in range(0, len(ticket_ids), 500):
+        chunk = ticket_ids[i : i + 500]
+        marks = ",".join("?" * len(chunk))
+        out.update(c.execute(f"SELECT ticket_id, shard FROM ticket_directory WHERE ticket_id IN ({marks})", chunk).fetchall())
+    c.close()
+    known = {s: _known_shard(s) for s in set(out.values())}
+    return {t: s if known[s] else None for t, s in out.items()}
+
+
+def entity_shard(entity_type: str, entity_id: str) -> str:
+    if entity_type == "email":
+        return email_shard(entity_id)
+    if entity_type == "ticket":
+        # An unknown ticket has no events anywhere; home answers "none".
+        return ticket_shard(entity_id) or HOME_SHARD
+    return HOME_SHARD
+
+
+def _add_column(cur: sqlite3.Cursor, table: str, column: str, decl: str):
+    cur.execute(f"PRAGMA table_info({table})")
+    if column not in {r[1] for r in cur.fetchall()}:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _create_shard_tables(cur: sqlite3.Cursor, shard: str):
+    # Tables that are partitioned across shards, with their indexes.
+    cur.execute(AUDIT_LOG_DDL)
 
     cur.execute(
         """
@@ -66,25 +242,165 @@ def ensure_db():
         """
     )
 
+    # SLA scheduling columns (core.sla); added in place on older databases.
+    _add_column(cur, "tickets", "sla_due_at", "TEXT")
+    _add_column(cur, "tickets", "priority_rank", "INTEGER NOT NULL DEFAULT 1")
+    # Set by SLA escalation; the deadline then runs from here instead of created_at.
+    _add_column(cur, "tickets", "sla_rearmed_at", "TEXT")
+
     cur.execute("""CREATE INDEX IF NOT EXISTS idx_tickets_email_id ON tickets(email_id)""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_tickets_updated_at ON tickets(updated_at)""")
+    # Partial indexes over workable tickets: "next for assignee" and the due-soon scan.
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_tickets_next_due
+        ON tickets(assignee, sla_due_at, priority_rank DESC)
+        WHERE status IN ('Open', 'In Progress')
+        """
+    )
+    cur.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_tickets_sla_due
+        ON tickets(sla_due_at)
+        WHERE status IN ('Open', 'In Progress')
+        """
+    )
+    # Covers the timeline query so history pages never touch details_json.
+    cur.execute("""DROP INDEX IF EXISTS idx_audit_entity""")
+    cur.execute(AUDIT_TIMELINE_INDEX_DDL)
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_log(timestamp)""")
+
+    # One row per email evaluated by straight-through processing (core.stp); it
+    # lives in the email's shard so it commits with the ticket it creates.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stp_decisions (
+            email_id TEXT PRIMARY KEY,
+            decided_at TEXT NOT NULL,
+            decision TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            request_type TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            ticket_id TEXT
+        )
+        """
+    )
+
+    # Each shard numbers its own tickets (see ticket_prefix), inside the same
+    # transaction as the insert, so creators on different shards never meet.
+    prefix = ticket_prefix(shard)
+    cur.execute("""CREATE TABLE IF NOT EXISTS ticket_sequence (name TEXT PRIMARY KEY, value INTEGER NOT NULL)""")
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO ticket_sequence(name, value)
+        SELECT 'ticket', COALESCE(MAX(CAST(substr(ticket_id, ?) AS INTEGER)), 1000) FROM tickets WHERE ticket_id LIKE ?
+        """,
+        (len(prefix) + 1, prefix + "%"),
+    )
+
 
+def ensure_shard(name: str):
+    path = shard_path(name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    c = sqlite3.connect(path)
+    cur = c.cursor()
+    # Sessions that first touch a new shard together would otherwise race on
+    # _add_column's check-then-ALTER.
+    cur.execute("BEGIN IMMEDIATE")
+    _create_shard_tables(cur, name)
     c.commit()
     c.close()
+    if name != HOME_SHARD:
+        h = conn()
+        h.execute("INSERT OR IGNORE INTO shard_registry(name, created_at) VALUES (?, ?)", (name, now_iso()))
+        h.commit()
+        h.close()
+    _ready_shards.add(path)
 
 
-def get_review_state(email_id: str) -> Optional[Dict]:
+def ensure_db():
     c = conn()
     cur = c.cursor()
+
+    _create_shard_tables(cur, HOME_SHARD)
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_threads (
+            email_id TEXT PRIMARY KEY,
+            thread_id TEXT NOT NULL,
+            message_id TEXT,
+            subject_key TEXT NOT NULL,
+            participants_key TEXT NOT NULL,
+            received_at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_threads_message_id ON email_threads(message_id)""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_threads_subject ON email_threads(subject_key, participants_key, received_at)""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_threads_thread_id ON email_threads(thread_id)""")
+
+    # Shard directory (core.shards): email -> shard, and the tickets that
+    # live outside the shard their id names.
+    cur.execute("""CREATE TABLE IF NOT EXISTS shard_registry (name TEXT PRIMARY KEY, created_at TEXT NOT NULL)""")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS email_shards (
+            email_id TEXT PRIMARY KEY,
+            shard TEXT NOT NULL,
+            entity_code TEXT
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ticket_directory (
+            ticket_id TEXT PRIMARY KEY,
+            email_id TEXT NOT NULL,
+            shard TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_ticket_directory_email ON ticket_directory(email_id)""")
+
+    c.commit()
+    c.close()
+    _ready_shards.add(DB_PATH)
+
+
+def get_review_state(email_id: str) -> Optional[Dict]:
+    c = shard_conn(email_shard(email_id))
+    cur = c.cursor()
     cur.execute("SELECT review_status, last_saved_at, finalized_json FROM review_state WHERE email_id=?", (email_id,))
     row = cur.fetchone()
     c.close()
     if not row:
         return None
-    return {"review_status": row[0], "last_saved_at": row[1], "finalized": json.loads(row[2])}
+    state = {"review_status": row[0], "last_saved_at": row[1]}
+    saved = json.loads(row[2])
+    if saved.get("format") == REVIEW_STATE_FORMAT:
+        state["overrides"] = saved["overrides"]
+    else:
+        # Rows written before overrides-only storage hold the full finalized snapshot.
+        state["finalized"] = saved
+    return state
 
-def upsert_review_state(email_id: str, review_status: str, finalized: dict):
-    c = conn()
-    cur = c.cursor()
+def review_statuses() -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for shard in shard_names():
+        c = shard_conn(shard)
+        out.update(c.execute("SELECT email_id, review_status FROM review_state").fetchall())
+        c.close()
+    return out
+
+
+def upsert_review_state(email_id: str, review_status: str, overrides: dict, cur: Optional[sqlite3.Cursor] = None):
+    # Pass a `cur` on the email's shard to write inside the caller's transaction.
+    own = cur is None
+    if own:
+        c = shard_conn(email_shard(email_id))
+        cur = c.cursor()
     cur.execute(
         """
         INSERT INTO review_state(email_id, review_status, last_saved_at, finalized_json)
@@ -94,22 +410,147 @@ def upsert_review_state(email_id: str, review_status: str, finalized: dict):
             last_saved_at=excluded.last_saved_at,
             finalized_json=excluded.finalized_json
         """,
-        (email_id, review_status, now_iso(), json.dumps(finalized, ensure_ascii=False)),
+        (email_id, review_status, now_iso(), json.dumps({"format": REVIEW_STATE_FORMAT, "overrides": overrides}, ensure_ascii=False)),
     )
-    c.commit()
-    c.close()
+    if own:
+        c.commit()
+        c.close()
+
+
+def _event_id() -> str:
+    return f"AUD-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
 
 
 def write_audit(entity_type: str, entity_id: str, action: str, actor_name: str, details: dict):
-    c = conn()
+    c = shard_conn(entity_shard(entity_type, entity_id))
     cur = c.cursor()
-    event_id = f"AUD-{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
     cur.execute(
         """
         INSERT INTO audit_log(event_id, timestamp, entity_type, entity_id, action, actor_name, details_json)
         VALUES (?, ?, ?, ?, ?, ?, ?)
         """,
-        (event_id, now_iso(), entity_type, entity_id, action, actor_name, json.dumps(details, ensure_ascii=False)),
+        (_event_id(), now_iso(), entity_type, entity_id, action, actor_name, json.dumps(details, ensure_ascii=False)),
     )
     c.commit()
     c.close()
+
+
+def write_audit_many(events: List[Tuple[str, str, str, str, dict]], cur: Optional[sqlite3.Cursor] = None):
+    # events: (entity_type, entity_id, action, actor_name, details)
+    # Pass `cur` to write inside the caller's transaction; the caller commits and
+    # must only pass events for entities stored in that cursor's shard.
+    if not events:
+        return
+    ts = now_iso()
+    base_id = _event_id()
+    rows = [
+        (f"{base_id}-{i:04d}", ts, et, eid, action, actor, json.dumps(details, ensure_ascii=False))
+        for i, (et, eid, action, actor, details) in enumerate(events)
+    ]
+    sql = """
+        INSERT INTO audit_log(event_id, timestamp, entity_type, entity_id, action, actor_name, details_json)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """
+    if cur is not None:
+        cur.executemany(sql, rows)
+        return
+    by_shard: Dict[str, list] = {}
+    routes: Dict[Tuple[str, str], str] = {}
+    for row in rows:
+        key = (row[2], row[3])
+        if key not in routes:
+            routes[key] = entity_shard(*key)
+        by_shard.setdefault(routes[key], []).append(row)
+    for shard, shard_rows in by_shard.items():
+        c = shard_conn(shard)
+        c.cursor().executemany(sql, shard_rows)
+        c.commit()
+        c.close()
+
+
+def _entity_page(cur, entity_type: str, entity_id: str, limit: int, before: Optional[Tuple[str, str]]) -> List[dict]:
+    sql = """
+        SELECT timestamp, event_id, entity_type, entity_id, action, actor_name
+        FROM audit_log
+        WHERE entity_type=? AND entity_id=?
+        """
+    params = [entity_type, entity_id]
+    if before:
+        sql += " AND (timestamp, event_id) < (?, ?)"
+        params += list(before)
+    sql += " ORDER BY timestamp DESC, event_id DESC LIMIT ?"
+    params.append(limit)
+    cur.execute(sql, params)
+    return [
+        {"timestamp": r[0], "event_id": r[1], "entity_type": r[2], "entity_id": r[3], "action": r[4], "actor_name": r[5]}
+        for r in cur.fetchall()
+    ]
+
+
+def get_history(entities: List[Tuple[str, str]], limit: int = 25, before: Optional[Tuple[str, str]] = None) -> Dict:
+    # Newest first. `before` is the (timestamp, event_id) cursor returned as next_cursor.
+    # Events carry no details; fetch those for the rows you show with get_audit_details().
+    # core.audit imports this module, hence the local import.
+    from core.audit import archived_page
+
+    pages = []
+    for et, eid in entities:
+        c = shard_conn(entity_shard(et, eid))
+        page = _entity_page(c.cursor(), et, eid, limit + 1, before)
+        c.close()
+        if len(page) <= limit:
+            # The live log ran out: continue into the archive partitions
+            # (core.audit.archive_month), which only hold older months.
+            cursor = (page[-1]["timestamp"], page[-1]["event_id"]) if page else before
+            page += archived_page(et, eid, limit + 1 - len(page), cursor)
+        pages.append(page)
+
+    merged = list(heapq.merge(*pages, key=lambda e: (e["timestamp"], e["event_id"]), reverse=True))
+    events = merged[:limit]
+    next_cursor = (events[-1]["timestamp"], events[-1]["event_id"]) if len(merged) > limit else None
+    return {"events": events, "next_cursor": next_cursor}
+
+
+def tickets_for_emails(email_ids: List[str]) -> List[Tuple[str, str, str]]:
+    # (created_at, ticket_id, email_id) for the tickets of these emails, read
+    # from each email's shard.
+    by_shard: Dict[str, List[str]] = {}
+    for email_id in email_ids:
+        by_shard.setdefault(email_shard(email_id), []).append(email_id)
+    rows = []
+    for shard, ids in by_shard.items():
+        c = shard_conn(shard)
+        marks = ",".join("?" * len(ids))
+        rows.extend(c.execute(f"SELECT created_at, ticket_id, email_id FROM tickets WHERE email_id IN ({marks})", ids).fetchall())
+        c.close()
+    return rows
+
+
+def email_history(email_id: str, limit: int = 25, before: Optional[Tuple[str, str]] = None) -> Dict:
+    # Merges the email's own events with those of every ticket linked via tickets.email_id.
+    c = shard_conn(email_shard(email_id))
+    cur = c.cursor()
+    cur.execute("SELECT ticket_id FROM tickets WHERE email_id=?", (email_id,))
+    ticket_ids = [r[0] for r in cur.fetchall()]
+    c.close()
+    entities = [("email", email_id)] + [("ticket", t) for t in ticket_ids]
+    return get_history(entities, limit=limit, before=before)
+
+
+def get_audit_details(event_ids: List[str]) -> Dict[str, dict]:
+    out: Dict[str, dict] = {}
+    wanted = list(dict.fromkeys(event_ids))
+    for shard in shard_names():
+        if not wanted:
+            break
+        c = shard_conn(shard)
+        marks = ",".join("?" * len(wanted))
+        rows = c.execute(f"SELECT event_id, details_json FROM audit_log WHERE event_id IN ({marks})", wanted).fetchall()
+        c.close()
+        out.update((r[0], json.loads(r[1])) for r in rows)
+        wanted = [e for e in wanted if e not in out]
+    if wanted:
+        from core.audit import archived_details
+
+        out.update(archived_details(wanted))
+    return out
@@ -0,0 +1,143 @@
+import glob
+import json
+import os
+import sys
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from core.data import load_json
+
+
+# Compact, read-only view of the inbox for large mailboxes. Each email keeps one
+# __slots__ record with the fields the Inbox lists (sender, queue, assignee and
+# type strings interned, so 100k rows share a few hundred distinct values).
+# Full emails (body, to/cc, attachments) and agent cache entries are written
+# once to a blob file and read back by offset when a page needs them; the
+# offsets live in one array column rather than per-record objects.
+# Build one store per process and share it (ui.startup.email_store).
+
+STORE_DIR = os.path.join("storage", "email_store")
+
+
+class EmailSummary:
+    __slots__ = (
+        "email_id",
+        "received_at",
+        "from_email",
+        "from_name",
+        "subject",
+        "request_type",
+        "confidence",
+        "queue",
+        "assignee",
+        "pos",
+    )
+
+    def __init__(self, pos: int, email: dict, triage: tuple):
+        self.email_id = email["email_id"]
+        self.received_at = email["received_at"]
+        self.from_email = sys.intern(email["from"]["email"])
+        self.from_name = sys.intern(email["from"].get("name") or "")
+        self.subject = email["subject"]
+        self.request_type, self.confidence, self.queue, self.assignee = triage
+        self.pos = pos
+
+
+_NO_TRIAGE = ("UNKNOWN", 0.0, "", "")
+
+
+def triage(cached: dict) -> tuple:
+    c = cached.get("classification", {})
+    r = cached.get("routing_suggestion", {})
+    return (
+        sys.intern(c.get("request_type", "UNKNOWN")),
+        float(c.get("confidence", 0.0)),
+        sys.intern(r.get("queue", "")),
+        sys.intern(r.get("assignee", "")),
+    )
+
+
+def _blob_path(inbox_path: str, cache_path: str) -> str:
+    # Named after both inputs' mtimes, so a changed inbox or cache gets a new blob.
+    return os.path.join(STORE_DIR, f"blobs-{os.stat(inbox_path).st_mtime_ns}-{os.stat(cache_path).st_mtime_ns}.bin")
+
+
+def build_email_store(inbox_path: str, cache_path: str) -> Dict:
+    path = _blob_path(inbox_path, cache_path)
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+
+    # The agent cache is parsed and written out before the inbox is parsed, so
+    # only one of the two JSON files is ever held as dicts.
+    triaged: Dict[str, tuple] = {}
+    cache_spans: Dict[str, tuple] = {}
+    with open(tmp, "wb") as f:
+        for email_id, cached in load_json(cache_path).items():
+            start = f.tell()
+            cache_spans[email_id] = (start, start + f.write(_dumps(cached)))
+            triaged[email_id] = triage(cached)
+
+        records: List[EmailSummary] = []
+        # Email i is bytes email_bounds[i]:email_bounds[i+1]; its agent cache
+        # entry is cache_bounds[2i]:cache_bounds[2i+1] (empty when it has none).
+        email_bounds = array("Q", [f.tell()])
+        cache_bounds = array("Q")
+        for pos, e in enumerate(load_json(inbox_path)):
+            email_bounds.append(email_bounds[-1] + f.write(_dumps(e)))
+            cache_bounds.extend(cache_spans.get(e["email_id"], (0, 0)))
+            records.append(EmailSummary(pos, e, triaged.get(e["email_id"], _NO_TRIAGE)))
+    # Processes building the same store concurrently write identical files.
+    os.replace(tmp, path)
+    for old in glob.glob(os.path.join(STORE_DIR, "blobs-*.bin")):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    return {
+        "records": records,
+        "by_id": {r.email_id: r for r in records},
+        "email_bounds": email_bounds,
+        "cache_bounds": cache_bounds,
+        "path": path,
+        # Held open so a blob removed by a newer build stays readable. Sessions
+        # share the file position, so each seek+read holds the lock.
+        "file": open(path, "rb"),
+        "lock": threading.Lock(),
+    }
+
+
+def close_email_store(store: Dict):
+    with store["lock"]:
+        store["file"].close()
+
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _read(store: Dict, start: int, end: int):
+    if start == end:
+        return None
+    with store["lock"]:
+        f = store["file"]
+        f.seek(start)
+        data = f.read(end - start)
+    return json.loads(data)
+
+
+def load_email(store: Dict, email_id: str) -> Optional[dict]:
+    # The full email dict, as in inbox_emails.json.
+    record = store["by_id"].get(email_id)
+    if not record:
+        return None
+    return _read(store, store["email_bounds"][record.pos], store["email_bounds"][record.pos + 1])
+
+
+def load_agent_entry(store: Dict, email_id: str) -> Optional[dict]:
+    record = store["by_id"].get(email_id)
+    if not record:
+        return None
+    return _read(store, store["cache_bounds"][2 * record.pos], store["cache_bounds"][2 * record.pos + 1])
@@ -0,0 +1,46 @@
+from typing import Dict, List
+
+from core.db import review_statuses
+from core.email_store import EmailSummary, triage
+from core.threads import thread_map
+from core.tickets_full import ticket_ids_by_email
+
+
+def _links():
+    # A few whole-table queries for the inbox instead of two per email.
+    statuses = review_statuses()
+    tickets = ticket_ids_by_email()
+    threads = thread_map()
+    ticket_by_thread = {}
+    for email_id, ticket_id in tickets.items():
+        ticket_by_thread.setdefault(threads.get(email_id, email_id), ticket_id)
+    return statuses, tickets, threads, ticket_by_thread
+
+
+def inbox_rows(emails: List[Dict], agent_cache: Dict) -> List[Dict]:
+    # summary_rows() for inbox_emails.json / agent_cache.json dicts.
+    return summary_rows([EmailSummary(pos, e, triage(agent_cache.get(e["email_id"], {}))) for pos, e in enumerate(emails)])
+
+
+def summary_rows(records: List[EmailSummary]) -> List[Dict]:
+    statuses, tickets, threads, ticket_by_thread = _links()
+    rows = []
+    for e in records:
+        eid = e.email_id
+        thread_id = threads.get(eid, eid)
+        rows.append(
+            {
+                "email_id": eid,
+                "received_at": e.received_at,
+                "from_email": e.from_email,
+                "subject": e.subject,
+                "review_status": statuses.get(eid) or "NEW",
+                "request_type": e.request_type,
+                "confidence": e.confidence,
+                "queue": e.queue,
+                "assignee": e.assignee,
+                "ticket_id": tickets.get(eid) or ticket_by_thread.get(thread_id),
+                "thread_id": thread_id,
+            }
+        )
+    return rows
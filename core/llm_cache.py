@@ -0,0 +1,362 @@
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from core.config import get_section
+
+
+# Model response cache. Keyed by the normalized prompt (input + instructions,
+# whitespace collapsed), model, temperature and max_output_tokens. Entries live
+# in their own SQLite file (so cache traffic never takes the app DB's writer
+# lock) behind a small in-process LRU, expire after ttl_hours and are evicted
+# least-recently-used past max_entries / max_mb. Hit, miss, eviction and
+# tokens-saved counters are kept alongside for cost accounting.
+#
+# Any code path that calls the OpenAI client can go through it:
+#   from core.llm_cache import cached_responses_create
+#   resp = cached_responses_create(client, model=..., input=..., temperature=..., max_output_tokens=...)
+#   resp["output_text"], resp["usage"], resp["cached"]
+# or use cache_key() / get() / put() around another call shape.
+
+COUNTERS = ("hits", "memory_hits", "misses", "evictions", "expired", "input_tokens_saved", "output_tokens_saved")
+_SPACE_RE = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, entry)
+_pending: Dict[str, int] = {}  # counters not yet written to the cache DB
+_touched: Dict[str, int] = {}  # memory hits per key, not yet written to the cache DB
+_ready = set()
+
+
+def cache_settings() -> dict:
+    cfg = get_section("llm_cache")
+    return {
+        # Defaults to the demo switch when [llm_cache] does not say.
+        "enabled": bool(cfg.get("enabled", get_section("demo").get("cache_enabled", True))),
+        "path": cfg.get("path", os.path.join("storage", "llm_cache.db")),
+        "ttl_hours": float(cfg.get("ttl_hours", 168)),
+        "max_entries": int(cfg.get("max_entries", 5000)),
+        "max_mb": float(cfg.get("max_mb", 50)),
+        "memory_entries": int(cfg.get("memory_entries", 256)),
+        # USD per million tokens, by model: {"gpt-4.1-mini": {"input": 0.4, "output": 1.6}}
+        "prices": cfg.get("prices", {}),
+    }
+
+
+def _conn(path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    c = sqlite3.connect(path)
+    if path not in _ready:
+        c.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_preview TEXT NOT NULL,
+                response_json TEXT NOT NULL,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                size_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_hit_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        c.execute("""CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON llm_cache(last_hit_at)""")
+        c.execute("""CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache(expires_at)""")
+        c.execute("""CREATE TABLE IF NOT EXISTS llm_cache_counters (model TEXT NOT NULL, name TEXT NOT NULL, value INTEGER NOT NULL, PRIMARY KEY (model, name))""")
+        c.commit()
+        _ready.add(path)
+    return c
+
+
+def normalize_prompt(input: Any, instructions: Optional[str] = None) -> str:
+    # Whitespace-insensitive, and stable for message lists (Responses API input).
+    def norm(value):
+        if isinstance(value, str):
+            return _SPACE_RE.sub(" ", value).strip()
+        if isinstance(value, list):
+            return [norm(v) for v in value]
+        if isinstance(value, dict):
+            return {k: norm(v) for k, v in value.items()}
+        return value
+
+    return json.dumps({"instructions": norm(instructions), "input": norm(input)}, sort_keys=True, ensure_ascii=False)
+
+
+def cache_key(input: Any, model: str, temperature: Optional[float] = None, max_output_tokens: Optional[int] = None, instructions: Optional[str] = None) -> str:
+    raw = json.dumps([normalize_prompt(input, instructions), model, temperature, max_output_tokens], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _count(model: str, name: str, n: int = 1):
+    # Called with _lock held; flushed in batches so memory hits stay cheap.
+    k = f"{model}\t{name}"
+    _pending[k] = _pending.get(k, 0) + n
+
+
+def flush_counters(settings: Optional[dict] = None):
+    settings = settings or cache_settings()
+    with _lock:
+        pending, touched = dict(_pending), dict(_touched)
+        _pending.clear()
+        _touched.clear()
+    if not pending and not touched:
+        return
+    c = _conn(settings["path"])
+    c.executemany(
+        """
+        INSERT INTO llm_cache_counters(model, name, value) VALUES (?, ?, ?)
+        ON CONFLICT(model, name) DO UPDATE SET value = value + excluded.value
+        """,
+        [(*k.split("\t"), v) for k, v in pending.items()],
+    )
+    # Memory hits keep their SQLite row recent, so LRU eviction sees them.
+    now = time.time()
+    c.executemany("UPDATE llm_cache SET hits = hits + ?, last_hit_at = ? WHERE cache_key=?", [(n, now, k) for k, n in touched.items()])
+    c.commit()
+    c.close()
+
+
+atexit.register(lambda: flush_counters() if _pending or _touched else None)
+
+
+def _remember(key: str, expires_at: float, entry: dict, limit: int):
+    with _lock:
+        _memory[key] = (expires_at, entry)
+        _memory.move_to_end(key)
+        while len(_memory) > limit:
+            _memory.popitem(last=False)
+
+
+def get(key: str, model: str, settings: Optional[dict] = None) -> Optional[dict]:
+    settings = settings or cache_settings()
+    now = time.time()
+    with _lock:
+        hit = _memory.get(key)
+        if hit and hit[0] > now:
+            _memory.move_to_end(key)
+            _touched[key] = _touched.get(key, 0) + 1
+            entry = hit[1]
+            _count(model, "hits")
+            _count(model, "memory_hits")
+            _count(model, "input_tokens_saved", entry["usage"]["input_tokens"])
+            _count(model, "output_tokens_saved", entry["usage"]["output_tokens"])
+            flush = sum(_touched.values()) >= 50
+        else:
+            hit = None
+    if hit:
+        if flush:
+            flush_counters(settings)
+        return entry
+
+    c = _conn(settings["path"])
+    row = c.execute("SELECT response_json, expires_at FROM llm_cache WHERE cache_key=?", (key,)).fetchone()
+    if row and row[1] > now:
+        c.execute("UPDATE llm_cache SET hits = hits + 1, last_hit_at = ? WHERE cache_key=?", (now, key))
+        c.commit()
+    c.close()
+    if not row or row[1] <= now:
+        with _lock:
+            _count(model, "misses")
+            if row:
+                _count(model, "expired")
+        return None
+
+    entry = json.loads(row[0])
+    _remember(key, row[1], entry, settings["memory_entries"])
+    with _lock:
+        _count(model, "hits")
+        _count(model, "input_tokens_saved", entry["usage"]["input_tokens"])
+        _count(model, "output_tokens_saved", entry["usage"]["output_tokens"])
+    flush_counters(settings)
+    return entry
+
+
+def put(key: str, model: str, prompt_preview: str, entry: dict, settings: Optional[dict] = None) -> int:
+    # Stores the entry and evicts; returns the number of rows evicted.
+    settings = settings or cache_settings()
+    now = time.time()
+    expires_at = now + settings["ttl_hours"] * 3600
+    data = json.dumps(entry, ensure_ascii=False)
+    c = _conn(settings["path"])
+    cur = c.cursor()
+    cur.execute(
+        """
+        INSERT OR REPLACE INTO llm_cache(cache_key, model, prompt_preview, response_json, input_tokens, output_tokens, size_bytes, created_at, last_hit_at, expires_at, hits)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+        """,
+        (key, model, prompt_preview[:200], data, entry["usage"]["input_tokens"], entry["usage"]["output_tokens"], len(data), now, now, expires_at),
+    )
+    c.commit()
+    c.close()
+    _remember(key, expires_at, entry, settings["memory_entries"])
+    # Pending memory hits first, so the LRU order below sees them.
+    flush_counters(settings)
+    evicted = prune(settings=settings)
+    flush_counters(settings)
+    return evicted
+
+
+def prune(expired_only: bool = False, settings: Optional[dict] = None) -> int:
+    # Expired entries first, then least recently used past max_entries / max_mb.
+    settings = settings or cache_settings()
+    c = _conn(settings["path"])
+    cur = c.cursor()
+    drop = cur.execute("SELECT cache_key FROM llm_cache WHERE expires_at <= ?", (time.time(),)).fetchall()
+    cur.executemany("DELETE FROM llm_cache WHERE cache_key=?", drop)
+    if not expired_only:
+        count, size = cur.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM llm_cache").fetchone()
+        max_bytes = settings["max_mb"] * 1e6
+        if count > settings["max_entries"] or size > max_bytes:
+            lru, freed = [], 0
+            for key, nbytes in cur.execute("SELECT cache_key, size_bytes FROM llm_cache ORDER BY last_hit_at").fetchall():
+                if count - len(lru) <= settings["max_entries"] and size - freed <= max_bytes:
+                    break
+                lru.append((key,))
+                freed += nbytes
+            cur.executemany("DELETE FROM llm_cache WHERE cache_key=?", lru)
+            drop += lru
+    c.commit()
+    c.close()
+    if drop:
+        with _lock:
+            for (key,) in drop:
+                _memory.pop(key, None)
+            _count("*", "evictions", len(drop))
+    return len(drop)
+
+
+def clear(settings: Optional[dict] = None) -> int:
+    settings = settings or cache_settings()
+    c = _conn(settings["path"])
+    n = c.execute("DELETE FROM llm_cache").rowcount
+    c.commit()
+    c.close()
+    with _lock:
+        _memory.clear()
+    return n
+
+
+def _usage(resp) -> dict:
+    usage = getattr(resp, "usage", None)
+    return {
+        "input_tokens": int(getattr(usage, "input_tokens", 0) or 0),
+        "output_tokens": int(getattr(usage, "output_tokens", 0) or 0),
+    }
+
+
+def cached_responses_create(client, *, model: str, input: Any, temperature: Optional[float] = None, max_output_tokens: Optional[int] = None, instructions: Optional[str] = None, **kwargs) -> dict:
+    # client.responses.create() through the cache. Returns
+    # {"output_text", "model", "response_id", "usage": {input_tokens, output_tokens}, "cached"}.
+    # Calls with tools or other extra kwargs are not cacheable and go straight through.
+    settings = cache_settings()
+    args = {"model": model, "input": input, **kwargs}
+    for name, value in (("temperature", temperature), ("max_output_tokens", max_output_tokens), ("instructions", instructions)):
+        if value is not None:
+            args[name] = value
+
+    cacheable = settings["enabled"] and not kwargs
+    if cacheable:
+        key = cache_key(input, model, temperature, max_output_tokens, instructions)
+        entry = get(key, model, settings)
+        if entry is not None:
+            return {**entry, "cached": True}
+
+    resp = client.responses.create(**args)
+    entry = {
+        "output_text": resp.output_text,
+        "model": getattr(resp, "model", model),
+        "response_id": getattr(resp, "id", None),
+        "usage": _usage(resp),
+    }
+    if cacheable:
+        preview = _SPACE_RE.sub(" ", input if isinstance(input, str) else json.dumps(input, ensure_ascii=False)).strip()
+        put(key, model, preview, entry, settings)
+    return {**entry, "cached": False}
+
+
+def cache_stats(settings: Optional[dict] = None) -> dict:
+    settings = settings or cache_settings()
+    flush_counters(settings)
+    c = _conn(settings["path"])
+    entries, size = c.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM llm_cache").fetchone()
+    rows = c.execute("SELECT model, name, value FROM llm_cache_counters").fetchall()
+    c.close()
+
+    totals = {name: 0 for name in COUNTERS}
+    by_model: Dict[str, Dict[str, int]] = {}
+    for model, name, value in rows:
+        totals[name] = totals.get(name, 0) + value
+        if model != "*":
+            by_model.setdefault(model, {n: 0 for n in COUNTERS})[name] = value
+
+    saved_usd = 0.0
+    for model, counts in by_model.items():
+        price = settings["prices"].get(model, {})
+        saved_usd += counts["input_tokens_saved"] / 1e6 * float(price.get("input", 0))
+        saved_usd += counts["output_tokens_saved"] / 1e6 * float(price.get("output", 0))
+    lookups = totals["hits"] + totals["misses"]
+    return {
+        "enabled": settings["enabled"],
+        "path": settings["path"],
+        "entries": entries,
+        "size_mb": round(size / 1e6, 3),
+        **totals,
+        "hit_rate": round(totals["hits"] / lookups, 3) if lookups else None,
+        "saved_usd": round(saved_usd, 4),
+        "by_model": by_model,
+    }
+
+
+def list_entries(limit: int = 20, settings: Optional[dict] = None) -> List[dict]:
+    settings = settings or cache_settings()
+    c = _conn(settings["path"])
+    rows = c.execute(
+        """
+        SELECT cache_key, model, prompt_preview, input_tokens, output_tokens, size_bytes, hits, last_hit_at, expires_at
+        FROM llm_cache ORDER BY last_hit_at DESC LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+    c.close()
+    keys = ("cache_key", "model", "prompt_preview", "input_tokens", "output_tokens", "size_bytes", "hits", "last_hit_at", "expires_at")
+    return [dict(zip(keys, r)) for r in rows]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Model response cache: inspect and prune")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="hit rate, tokens and cost saved, size")
+    ls = sub.add_parser("list", help="most recently used entries")
+    ls.add_argument("--limit", type=int, default=20)
+    p = sub.add_parser("prune", help="drop expired entries, then LRU past max_entries / max_mb")
+    p.add_argument("--expired-only", action="store_true")
+    sub.add_parser("clear", help="drop every entry (counters are kept)")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "stats":
+        print(json.dumps(cache_stats(), indent=2))
+    elif args.cmd == "list":
+        for e in list_entries(args.limit):
+            left_h = (e["expires_at"] - time.time()) / 3600
+            print(f"{e['cache_key'][:12]}  {e['model']:<16}{e['hits']:>5} hits{e['input_tokens'] + e['output_tokens']:>7} tok  {left_h:6.1f}h left  {e['prompt_preview'][:60]}")
+    elif args.cmd == "prune":
+        print(f"{prune(expired_only=args.expired_only)} entries evicted")
+        flush_counters()
+    else:
+        print(f"{clear()} entries removed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+
+from core.data import load_json
+from core.overlay import get_value, set_value
+
+
+# Vendor/customer master lookup. The master file is loaded once into an index of
+#   - exact ID maps (vendor_id / customer_id -> record),
+#   - normalized names and aliases (exact hits skip fuzzy scoring),
+#   - a trigram inverted index over normalized names for fuzzy matching.
+# master_index() reloads it when the file's mtime changes.
+#
+# JSON: {"vendors": [{vendor_id, name, aliases, entity_code}], "customers": [...]}
+# CSV:  kind,id,name,aliases,entity_code   (kind is vendor|customer, aliases ';'-separated)
+
+MASTER_PATH = os.path.join("data", "vendor_master.json")
+MIN_SCORE = 0.6
+KINDS = ("vendor", "customer")
+
+_LEGAL_SUFFIXES = {
+    "inc", "incorporated", "llc", "llp", "lp", "ltd", "limited", "corp", "corporation", "co", "company",
+    "plc", "gmbh", "ag", "sa", "sas", "bv", "nv", "pty", "pvt", "srl", "oy", "ab", "kk", "the",
+}
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+
+_lock = threading.Lock()
+_loaded: Dict[str, tuple] = {}
+
+
+def normalize_name(name: str) -> str:
+    tokens = _NON_ALNUM_RE.sub(" ", (name or "").lower().replace("&", " and ")).split()
+    kept = [t for t in tokens if t not in _LEGAL_SUFFIXES]
+    return " ".join(kept or tokens)
+
+
+def trigrams(norm: str) -> set:
+    padded = f"  {norm} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _read_records(path: str) -> List[dict]:
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return [
+                {
+                    "kind": row["kind"].strip().lower(),
+                    "id": row["id"].strip(),
+                    "name": row["name"].strip(),
+                    "aliases": [a.strip() for a in (row.get("aliases") or "").split(";") if a.strip()],
+                    "entity_code": (row.get("entity_code") or "").strip() or None,
+                }
+                for row in csv.DictReader(f)
+            ]
+    raw = load_json(path)
+    records = []
+    for kind in KINDS:
+        for r in raw.get(f"{kind}s", []):
+            records.append(
+                {
+                    "kind": kind,
+                    "id": r[f"{kind}_id"],
+                    "name": r["name"],
+                    "aliases": r.get("aliases") or [],
+                    "entity_code": r.get("entity_code"),
+                }
+            )
+    return records
+
+
+def build_master_index(records: List[dict]) -> Dict:
+    # Postings hold small ints (positions in `names`) and are frozen to tuples,
+    # so the index stays compact and is safe to share across threads/sessions.
+    by_id: Dict[str, Dict[str, dict]] = {k: {} for k in KINDS}
+    by_name: Dict[str, Dict[str, int]] = {k: {} for k in KINDS}
+    postings: Dict[str, Dict[str, list]] = {k: defaultdict(list) for k in KINDS}
+    # One entry per indexed name (canonical or alias): (record position, trigram count).
+    names: List[Tuple[int, int]] = []
+
+    for pos, r in enumerate(records):
+        kind = r["kind"]
+        by_id[kind][r["id"]] = r
+        for name in [r["name"], *r["aliases"]]:
+            norm = normalize_name(name)
+            if not norm or norm in by_name[kind]:
+                continue
+            by_name[kind][norm] = pos
+            grams = trigrams(norm)
+            for g in grams:
+                postings[kind][g].append(len(names))
+            names.append((pos, len(grams)))
+
+    return {
+        "records": records,
+        "by_id": by_id,
+        "by_name": by_name,
+        "postings": {k: {g: tuple(ids) for g, ids in p.items()} for k, p in postings.items()},
+        "names": names,
+    }
+
+
+def load_master_index(path: str = MASTER_PATH) -> Dict:
+    return build_master_index(_read_records(path))
+
+
+def master_index(path: str = MASTER_PATH) -> Optional[Dict]:
+    # Hot reload: one stat() per call; the file is re-read only when it changes.
+    if not os.path.exists(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    cached = _loaded.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with _lock:
+        cached = _loaded.get(path)
+        if not cached or cached[0] != mtime:
+            cached = (mtime, load_master_index(path))
+            _loaded[path] = cached
+    return cached[1]
+
+
+def match_name(index: Dict, kind: str, name: str, min_score: float = MIN_SCORE) -> Optional[dict]:
+    # Returns {"record", "score", "method"} for the best master record, or None.
+    norm = normalize_name(name)
+    if not norm:
+        return None
+    pos = index["by_name"][kind].get(norm)
+    if pos is not None:
+        return {"record": index["records"][pos], "score": 1.0, "method": "exact"}
+
+    # Shared-trigram counts per indexed name are tallied in C (Counter over the
+    # chained postings); only names that can reach min_score are then scored.
+    grams = trigrams(norm)
+    postings = index["postings"][kind]
+    need = math.ceil(min_score * len(grams) / (2.0 - min_score))
+    shared = Counter(chain.from_iterable(postings.get(g, ()) for g in grams))
+    best_pos, best_score = None, 0.0
+    names = index["names"]
+    for name_id, n in shared.items():
+        if n < need:
+            continue
+        pos, size = names[name_id]
+        score = 2.0 * n / (len(grams) + size)  # Dice coefficient over trigrams
+        if score > best_score:
+            best_pos, best_score = pos, score
+    if best_pos is None or best_score < min_score:
+        return None
+    return {"record": index["records"][best_pos], "score": round(best_score, 3), "method": "trigram"}
+
+
+def lookup_id(index: Dict, kind: str, record_id: str) -> Optional[dict]:
+    return index["by_id"][kind].get((record_id or "").strip())
+
+
+def master_fills(base: dict, overrides: dict, index: Dict, exact_only: bool = False) -> List[dict]:
+    # Fills extraction.fields.<kind>_id and extraction.entity_code from the
+    # master record when they are empty, as overrides on top of the agent's
+    # suggestion (core.overlay). Values the agent or reviewer set are kept.
+    # exact_only skips trigram matches: a fuzzy guess is fine as a suggestion
+    # for a reviewer, not as the value that lets an email skip review.
+    fills = []
+    for kind in KINDS:
+        id_path = f"extraction.fields.{kind}_id"
+        known_id = get_value(base, overrides, id_path)
+        if known_id:
+            record = lookup_id(index, kind, known_id)
+            match = {"record": record, "score": 1.0, "method": "id"} if record else None
+        else:
+            name = get_value(base, overrides, f"extraction.fields.{kind}_name")
+            match = match_name(index, kind, name) if name else None
+            if match and exact_only and match["method"] != "exact":
+                match = None
+        if not match:
+            continue
+        record = match["record"]
+        filled = {}
+        if not known_id:
+            set_value(base, overrides, id_path, record["id"])
+            filled[id_path] = record["id"]
+        if record["entity_code"] and not get_value(base, overrides, "extraction.entity_code"):
+            set_value(base, overrides, "extraction.entity_code", record["entity_code"])
+            filled["extraction.entity_code"] = record["entity_code"]
+        fills.append(
+            {
+                "kind": kind,
+                "master_id": record["id"],
+                "master_name": record["name"],
+                "score": match["score"],
+                "method": match["method"],
+                "filled": filled,
+            }
+        )
+    return fills
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Vendor/customer master lookup")
+    parser.add_argument("name")
+    parser.add_argument("--kind", choices=KINDS, default="vendor")
+    parser.add_argument("--path", default=MASTER_PATH)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    index = master_index(args.path)
+    t1 = time.perf_counter()
+    match = match_name(index, args.kind, args.name)
+    t2 = time.perf_counter()
+    print(json.dumps(match, indent=2))
+    print(f"index {(t1 - t0) * 1000:.2f} ms, match {(t2 - t1) * 1e6:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
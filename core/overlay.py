@@ -0,0 +1,78 @@
+from typing import Any, Dict
+
+
+# A review is the agent's suggestion (shared, never mutated) plus a sparse
+# dict of dotted-path overrides, e.g. {"routing.queue": "AP Payments"}.
+# Only the overrides are persisted; the full view is rebuilt on demand.
+
+_MISSING = object()
+
+
+def suggestions_from_cache(cached: dict) -> dict:
+    # New top-level dict only; the nested sections are the cache's own objects.
+    return {
+        "classification": cached["classification"],
+        "extraction": cached["extraction"],
+        "routing": cached["routing_suggestion"],
+        "draft_response": cached.get("draft_response"),
+        "overrides": {"routing_overridden": False, "override_reason": ""},
+    }
+
+
+def _lookup(node: Any, path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return _MISSING
+        node = node[part]
+    return node
+
+
+def get_value(base: dict, overrides: Dict[str, Any], path: str, default: Any = None) -> Any:
+    if path in overrides:
+        return overrides[path]
+    value = _lookup(base, path)
+    return default if value is _MISSING else value
+
+
+def set_value(base: dict, overrides: Dict[str, Any], path: str, value: Any) -> bool:
+    # Returns True when the effective value changed. Setting a path back to the
+    # suggestion drops the override instead of storing a redundant copy.
+    if get_value(base, overrides, path, _MISSING) == value:
+        return False
+    if _lookup(base, path) == value:
+        overrides.pop(path, None)
+    else:
+        overrides[path] = value
+    return True
+
+
+def materialize(base: dict, overrides: Dict[str, Any]) -> dict:
+    # Structural sharing: only the dicts along an overridden path are copied,
+    # everything else is the suggestion's own object. Treat the result as read-only.
+    out = dict(base)
+    copied = set()
+    for path in sorted(overrides):
+        parts = path.split(".")
+        node = out
+        for i, part in enumerate(parts[:-1]):
+            prefix = ".".join(parts[: i + 1])
+            if prefix not in copied:
+                child = node.get(part)
+                node[part] = dict(child) if isinstance(child, dict) else {}
+                copied.add(prefix)
+            node = node[part]
+        node[parts[-1]] = overrides[path]
+    return out
+
+
+def diff(base: dict, finalized: dict, prefix: str = "") -> Dict[str, Any]:
+    # Overrides that turn `base` into `finalized`; used to migrate full snapshots.
+    out: Dict[str, Any] = {}
+    for key, value in finalized.items():
+        path = f"{prefix}{key}"
+        before = base.get(key, _MISSING) if isinstance(base, dict) else _MISSING
+        if isinstance(value, dict) and isinstance(before, dict):
+            out.update(diff(before, value, prefix=f"{path}."))
+        elif before is _MISSING or before != value:
+            out[path] = value
+    return out
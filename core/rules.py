@@ -0,0 +1,46 @@
+from typing import Dict, List
+
+
+REQUEST_TYPES = [
+    "AP_INVOICE_PROCESSING",
+    "AP_VENDOR_PAYMENT_INQUIRY",
+    "AP_VENDOR_MASTERDATA_CHANGE",
+    "EXPENSE_REIMBURSEMENT_ISSUE",
+    "AR_CUSTOMER_INVOICE_REQUEST",
+    "AR_CASH_APPLICATION",
+    "AR_CREDIT_MEMO_REQUEST",
+    "GL_JOURNAL_ENTRY_REQUEST",
+    "AP_3WAY_MATCH_EXCEPTION",
+    "CLOSE_SUPPORT_REQUEST",
+]
+
+# Required missing for this demo (keep minimal)
+REQUIRED_BY_TYPE: Dict[str, List[str]] = {
+    "AP_INVOICE_PROCESSING": ["entity_code", "invoice_date", "invoice_number", "vendor_name", "po_number"],
+    "AP_VENDOR_PAYMENT_INQUIRY": ["entity_code", "invoice_number", "vendor_name"],
+    "AP_VENDOR_MASTERDATA_CHANGE": ["entity_code", "vendor_name", "vendor_id", "change_type"],
+    "AP_3WAY_MATCH_EXCEPTION": ["entity_code", "po_number", "invoice_number"],
+    "EXPENSE_REIMBURSEMENT_ISSUE": ["entity_code", "employee_id", "expense_report_id"],
+    "AR_CUSTOMER_INVOICE_REQUEST": ["entity_code", "customer_name", "po_number", "invoice_amount"],
+    "AR_CASH_APPLICATION": ["entity_code", "payment_amount", "bank_reference"],
+    "AR_CREDIT_MEMO_REQUEST": ["entity_code", "customer_name", "invoice_number", "requested_credit_amount", "reason"],
+    "GL_JOURNAL_ENTRY_REQUEST": ["entity_code", "effective_date", "amount", "debit_account", "credit_account"],
+    "CLOSE_SUPPORT_REQUEST": ["entity_code", "account", "variance_amount"],
+}
+
+
+def required_fields(request_type: str) -> List[str]:
+    return REQUIRED_BY_TYPE.get(request_type, ["entity_code"])
+
+
+def missing_required_fields(request_type: str, extraction: dict) -> List[str]:
+    fields = extraction.get("fields") or {}
+    missing = []
+    for k in required_fields(request_type):
+        if k == "entity_code":
+            if not extraction.get("entity_code"):
+                missing.append("entity_code")
+        else:
+            if not fields.get(k):
+                missing.append(k)
+    return missing
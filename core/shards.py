@@ -0,0 +1,277 @@
+import argparse
+import glob
+import json
+import os
+import sqlite3
+from typing import Dict, List, Optional
+
+from core.data import load_json
+from core.db import (
+    HOME_SHARD,
+    _CODE_RE,
+    _shard_of,
+    conn,
+    ensure_db,
+    ensure_shard,
+    hash_shard,
+    shard_conn,
+    shard_from_ticket_id,
+    shard_path,
+    storage_settings,
+    ticket_prefix,
+)
+from core.master_data import master_index, match_name
+from core.tickets_full import _chunks
+
+
+# Storage routing policy (the primitives are in core.db):
+#   sharding = "off"     everything in the home DB (storage/demo.db)
+#   sharding = "entity"  one file per legal entity, storage/shards/entity_<CODE>.db;
+#                        emails are assigned at intake from extraction.entity_code
+#                        (or the vendor/customer master), unknown ones stay home
+#   sharding = "hash"    hash_shards files keyed by crc32(email_id); no assignment needed
+# A ticket lives in its email's shard and its id names the shard that issued it.
+# Changing the mode or hash_shards needs a rebalance, run with the app and API
+# stopped:
+#   python -m core.shards rebalance [--dry-run]
+
+def entity_shard_name(entity_code: Optional[str]) -> str:
+    code = _CODE_RE.sub("", entity_code or "").upper()
+    return f"entity_{code}" if code else HOME_SHARD
+
+
+def entity_code_for(cached: Optional[dict]) -> Optional[str]:
+    extraction = (cached or {}).get("extraction") or {}
+    if extraction.get("entity_code"):
+        return extraction["entity_code"]
+    index = master_index()
+    fields = extraction.get("fields") or {}
+    for kind in ("vendor", "customer"):
+        name = fields.get(f"{kind}_name")
+        match = match_name(index, kind, name) if index and name else None
+        if match and match["record"]["entity_code"]:
+            return match["record"]["entity_code"]
+    return None
+
+
+def target_shard(email_id: str, entity_code: Optional[str], mode: Optional[str] = None) -> str:
+    mode = mode or storage_settings()["sharding"]
+    if mode == "entity":
+        return entity_shard_name(entity_code)
+    if mode == "hash":
+        return hash_shard(email_id)
+    return HOME_SHARD
+
+
+def assign_emails(emails: List[dict], agent_cache: Dict) -> int:
+    # Intake step for entity sharding, like core.threads.index_threads: records
+    # the shard of each new email before anything is written for it. Emails that
+    # already have rows in the home DB stay there until the next rebalance.
+    if storage_settings()["sharding"] != "entity":
+        return 0
+    c = conn()
+    cur = c.cursor()
+    known = {r[0] for r in cur.execute("SELECT email_id FROM email_shards").fetchall()}
+    new = sorted(e["email_id"] for e in emails if e["email_id"] not in known)
+    for chunk in _chunks(new):
+        marks = ",".join("?" * len(chunk))
+        cur.execute(
+            f"""
+            SELECT email_id FROM review_state WHERE email_id IN ({marks})
+            UNION SELECT email_id FROM stp_decisions WHERE email_id IN ({marks})
+            UNION SELECT email_id FROM tickets WHERE email_id IN ({marks})
+            UNION SELECT entity_id FROM audit_log WHERE entity_type='email' AND entity_id IN ({marks})
+            """,
+            chunk * 4,
+        )
+        touched = {r[0] for r in cur.fetchall()}
+        new = [e for e in new if e not in touched]
+
+    rows = []
+    for email_id in new:
+        code = entity_code_for(agent_cache.get(email_id))
+        rows.append((email_id, entity_shard_name(code), code))
+    cur.executemany("INSERT OR IGNORE INTO email_shards(email_id, shard, entity_code) VALUES (?, ?, ?)", rows)
+    c.commit()
+    c.close()
+    for shard in {r[1] for r in rows} - {HOME_SHARD}:
+        ensure_shard(shard)
+    return len(rows)
+
+
+def known_shards() -> List[str]:
+    # Every shard that may hold rows, whatever the current mode: the registry
+    # plus any file in shard_dir.
+    c = conn()
+    names = {r[0] for r in c.execute("SELECT name FROM shard_registry").fetchall()}
+    c.close()
+    names.update(os.path.basename(p)[:-3] for p in glob.glob(os.path.join(storage_settings()["shard_dir"], "*.db")))
+    return [HOME_SHARD] + sorted(names - {HOME_SHARD})
+
+
+def _emails_in_shard(cur) -> Dict[str, Optional[str]]:
+    # {email_id: entity_code from the ticket payload, if any}
+    cur.execute(
+        """
+        SELECT email_id, NULL FROM review_state
+        UNION ALL SELECT email_id, NULL FROM stp_decisions
+        UNION ALL SELECT entity_id, NULL FROM audit_log WHERE entity_type='email'
+        UNION ALL SELECT email_id, json_extract(payload_json, '$.extraction.entity_code') FROM tickets
+        """
+    )
+    out: Dict[str, Optional[str]] = {}
+    for email_id, code in cur.fetchall():
+        if code or email_id not in out:
+            out[email_id] = code or out.get(email_id)
+    return out
+
+
+def _move(source: str, target: str, email_ids: List[str]) -> int:
+    # One transaction across both files (ATTACH), so a row is never in both or neither.
+    ensure_shard(target)
+    c = shard_conn(source)
+    moved = 0
+    try:
+        c.execute("ATTACH DATABASE ? AS tgt", (shard_path(target),))
+        cur = c.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        for chunk in _chunks(email_ids):
+            marks = ",".join("?" * len(chunk))
+            cur.execute(f"SELECT ticket_id FROM main.tickets WHERE email_id IN ({marks})", chunk)
+            tickets = [r[0] for r in cur.fetchall()]
+            tmarks = ",".join("?" * len(tickets)) or "NULL"
+            audit_where = f"(entity_type='email' AND entity_id IN ({marks})) OR (entity_type='ticket' AND entity_id IN ({tmarks}))"
+            for table, where, params in (
+                ("review_state", f"email_id IN ({marks})", chunk),
+                ("stp_decisions", f"email_id IN ({marks})", chunk),
+                ("tickets", f"email_id IN ({marks})", chunk),
+                ("audit_log", audit_where, chunk + tickets),
+            ):
+                cur.execute(f"INSERT OR REPLACE INTO tgt.{table} SELECT * FROM main.{table} WHERE {where}", params)
+                cur.execute(f"DELETE FROM main.{table} WHERE {where}", params)
+                moved += cur.rowcount
+        c.commit()
+        c.execute("DETACH DATABASE tgt")
+    except Exception:
+        c.rollback()
+        raise
+    finally:
+        c.close()
+    return moved
+
+
+def rebalance(agent_cache: Optional[Dict] = None, dry_run: bool = False) -> dict:
+    # Moves every email's rows to the shard the current [storage] settings say it
+    # belongs in, then rebuilds the directory from what the shards now hold.
+    # Also the migration tool: off -> entity/hash and back, or a new hash_shards.
+    mode = storage_settings()["sharding"]
+    agent_cache = agent_cache or {}
+    c = conn()
+    assigned = dict(c.execute("SELECT email_id, entity_code FROM email_shards").fetchall())
+    c.close()
+
+    plan: Dict[tuple, List[str]] = {}
+    codes: Dict[str, Optional[str]] = {}
+    for source in known_shards():
+        c = shard_conn(source)
+        emails = _emails_in_shard(c.cursor())
+        c.close()
+        for email_id, ticket_code in emails.items():
+            code = assigned.get(email_id) or ticket_code or entity_code_for(agent_cache.get(email_id))
+            codes[email_id] = code
+            target = target_shard(email_id, code, mode)
+            if target != source:
+                plan.setdefault((source, target), []).append(email_id)
+
+    for email_id, code in assigned.items():
+        codes.setdefault(email_id, code)
+
+    result = {"mode": mode, "moves": {f"{s} -> {t}": len(ids) for (s, t), ids in sorted(plan.items())}, "rows_moved": 0}
+    if dry_run:
+        return result
+    for (source, target), ids in sorted(plan.items()):
+        result["rows_moved"] += _move(source, target, ids)
+
+    c = conn()
+    cur = c.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("DELETE FROM email_shards")
+        if mode == "entity":
+            cur.executemany(
+                "INSERT INTO email_shards(email_id, shard, entity_code) VALUES (?, ?, ?)",
+                [(e, target_shard(e, code, mode), code) for e, code in codes.items()],
+            )
+        cur.execute("DELETE FROM ticket_directory")
+        top: Dict[str, int] = {}
+        for shard in known_shards():
+            s = shard_conn(shard)
+            rows = s.execute("SELECT ticket_id, email_id, created_at FROM tickets").fetchall()
+            s.close()
+            cur.executemany(
+                "INSERT OR REPLACE INTO ticket_directory(ticket_id, email_id, shard, created_at) VALUES (?, ?, ?, ?)",
+                [(t, e, shard, created) for t, e, created in rows if shard_from_ticket_id(t) != shard],
+            )
+            for t, _, _ in rows:
+                prefix, _, n = t.rpartition("-")
+                if n.isdigit():
+                    top[prefix + "-"] = max(top.get(prefix + "-", 0), int(n))
+        c.commit()
+    except Exception:
+        c.rollback()
+        raise
+    finally:
+        c.close()
+    # A shard never reissues an id, even one whose ticket now lives elsewhere.
+    for shard in known_shards():
+        n = top.get(ticket_prefix(shard))
+        if n:
+            s = shard_conn(shard)
+            s.execute("UPDATE ticket_sequence SET value = MAX(value, ?) WHERE name='ticket'", (n,))
+            s.commit()
+            s.close()
+    _shard_of.clear()
+    return result
+
+
+def shard_stats() -> List[dict]:
+    stats = []
+    for shard in known_shards():
+        path = shard_path(shard)
+        if not os.path.exists(path):
+            continue
+        c = sqlite3.connect(path)
+        row = {"shard": shard, "path": path}
+        for table in ("tickets", "review_state", "audit_log"):
+            try:
+                row[table] = c.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            except sqlite3.OperationalError:
+                row[table] = 0
+        c.close()
+        stats.append(row)
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Storage shards: status, intake assignment and rebalancing")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="rows per shard")
+    sub.add_parser("assign", help="assign new inbox emails to entity shards")
+    r = sub.add_parser("rebalance", help="move rows to the shards the current [storage] settings choose")
+    r.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    ensure_db()
+    agent_cache = load_json(os.path.join("data", "agent_cache.json"))
+    if args.cmd == "status":
+        print(f"sharding = {storage_settings()['sharding']}")
+        for s in shard_stats():
+            print(f"{s['shard']:<16}{s['tickets']:>8} tickets{s['review_state']:>8} reviews{s['audit_log']:>10} audit  {s['path']}")
+    elif args.cmd == "assign":
+        print(f"{assign_emails(load_json(os.path.join('data', 'inbox_emails.json')), agent_cache)} emails assigned")
+    else:
+        print(json.dumps(rebalance(agent_cache, dry_run=args.dry_run), indent=2))
+
+
+if __name__ == "__main__":
+    main()
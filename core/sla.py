@@ -0,0 +1,221 @@
+import argparse
+import heapq
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Dict, List, Optional
+
+from core.config import get_section
+from core.db import ensure_db, now_iso, shard_conn, shard_names, write_audit_many
+
+
+PRIORITIES = ["Low", "Medium", "High", "Critical"]
+PRIORITY_RANK = {p: i for i, p in enumerate(PRIORITIES)}
+
+# Must match the WHERE clause of the partial indexes in core.db.ensure_db.
+ACTIVE_STATUSES_SQL = "status IN ('Open', 'In Progress')"
+
+
+def _settings() -> dict:
+    cfg = get_section("sla")
+    return {
+        "default_hours": float(cfg.get("default_hours", 72)),
+        "queue_hours": cfg.get("queue_hours", {}),
+        "priority_hours": cfg.get("priority_hours", {}),
+    }
+
+
+def utc_iso(dt: datetime) -> str:
+    # Deadlines are stored in UTC so they sort correctly as strings.
+    return dt.astimezone(timezone.utc).isoformat(timespec="seconds")
+
+
+def priority_rank(priority: str) -> int:
+    return PRIORITY_RANK.get(priority, PRIORITY_RANK["Medium"]) if isinstance(priority, str) else PRIORITY_RANK["Medium"]
+
+
+def sla_due_at(created_at: str, queue: str, priority: str, due_date: Optional[str] = None, rearmed_at: Optional[str] = None) -> str:
+    s = _settings()
+    # Queue, priority and due date come from payloads (API, agent cache); any
+    # other JSON type counts as unset and the default window applies.
+    queue_hours = s["queue_hours"].get(queue) if isinstance(queue, str) else None
+    priority_hours = s["priority_hours"].get(priority) if isinstance(priority, str) else None
+    if rearmed_at:
+        # Escalated: the deadline runs from the escalation at the new priority's target.
+        hours = float(priority_hours if priority_hours is not None else s["default_hours"])
+        return utc_iso(datetime.fromisoformat(rearmed_at) + timedelta(hours=hours))
+    created = datetime.fromisoformat(created_at)
+    candidates = [created + timedelta(hours=float(queue_hours if queue_hours is not None else s["default_hours"]))]
+    if priority_hours is not None:
+        candidates.append(created + timedelta(hours=float(priority_hours)))
+    if isinstance(due_date, str) and due_date:
+        try:
+            due = datetime.fromisoformat(due_date[:10]).replace(hour=23, minute=59, second=59, tzinfo=created.tzinfo)
+            candidates.append(due)
+        except ValueError:
+            pass
+    return utc_iso(min(candidates))
+
+
+def _due_date_from_payload(payload: dict) -> Optional[str]:
+    extraction = payload.get("extraction") if isinstance(payload, dict) else None
+    due = extraction.get("due_date") if isinstance(extraction, dict) else None
+    return due if isinstance(due, str) else None
+
+
+def sla_columns(created_at: str, queue: str, priority: str, payload: dict, rearmed_at: Optional[str] = None) -> Dict:
+    return {
+        "sla_due_at": sla_due_at(created_at, queue, priority, _due_date_from_payload(payload), rearmed_at),
+        "priority_rank": priority_rank(priority),
+    }
+
+
+def backfill_sla() -> int:
+    n = 0
+    for shard in shard_names():
+        c = shard_conn(shard)
+        cur = c.cursor()
+        cur.execute(
+            """
+            SELECT ticket_id, created_at, queue, priority, json_extract(payload_json, '$.extraction.due_date')
+            FROM tickets WHERE sla_due_at IS NULL
+            """
+        )
+        rows = cur.fetchall()
+        if rows:
+            cur.executemany(
+                "UPDATE tickets SET sla_due_at=?, priority_rank=? WHERE ticket_id=?",
+                [(sla_due_at(created, queue, prio, due), priority_rank(prio), tid) for tid, created, queue, prio, due in rows],
+            )
+            c.commit()
+        c.close()
+        n += len(rows)
+    return n
+
+
+def next_ticket_for(assignee: str) -> Optional[dict]:
+    # One seek on idx_tickets_next_due per shard: earliest deadline, highest priority first.
+    best = None
+    for shard in shard_names():
+        c = shard_conn(shard)
+        c.row_factory = sqlite3.Row
+        row = c.execute(
+            f"""
+            SELECT * FROM tickets
+            WHERE assignee=? AND {ACTIVE_STATUSES_SQL} AND sla_due_at IS NOT NULL
+            ORDER BY sla_due_at ASC, priority_rank DESC
+            LIMIT 1
+            """,
+            (assignee,),
+        ).fetchone()
+        c.close()
+        if row and (best is None or (row["sla_due_at"], -row["priority_rank"]) < (best["sla_due_at"], -best["priority_rank"])):
+            best = dict(row)
+    return best
+
+
+def due_soon(within_hours: float = 24, limit: int = 50, now: Optional[datetime] = None) -> List[dict]:
+    now = now or datetime.now(timezone.utc)
+    pages = []
+    for shard in shard_names():
+        c = shard_conn(shard)
+        c.row_factory = sqlite3.Row
+        rows = c.execute(
+            f"""
+            SELECT * FROM tickets
+            WHERE {ACTIVE_STATUSES_SQL} AND sla_due_at IS NOT NULL AND sla_due_at < ?
+            ORDER BY sla_due_at ASC
+            LIMIT ?
+            """,
+            (utc_iso(now + timedelta(hours=within_hours)), limit),
+        ).fetchall()
+        c.close()
+        pages.append([dict(r) for r in rows])
+    return list(islice(heapq.merge(*pages, key=lambda t: t["sla_due_at"]), limit))
+
+
+def escalate_breached(actor_name: str = "SLA Scheduler", now: Optional[datetime] = None) -> List[dict]:
+    # Bumps each breached ticket one priority level and re-arms its deadline to
+    # the new priority's target, so a ticket is escalated once per missed window.
+    # sla_rearmed_at keeps later edits from recomputing the deadline off created_at.
+    now = now or datetime.now(timezone.utc)
+    escalated = []
+    for shard in shard_names():
+        escalated.extend(_escalate_shard(shard, actor_name, now))
+    return escalated
+
+
+def _escalate_shard(shard: str, actor_name: str, now: datetime) -> List[dict]:
+    top = PRIORITY_RANK["Critical"]
+    rearmed_at = utc_iso(now)
+
+    c = shard_conn(shard)
+    cur = c.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            f"""
+            SELECT ticket_id, priority, priority_rank, sla_due_at FROM tickets
+            WHERE {ACTIVE_STATUSES_SQL} AND sla_due_at < ? AND priority_rank < ?
+            """,
+            (utc_iso(now), top),
+        )
+        escalated = []
+        for tid, prio, rank, due in cur.fetchall():
+            new_prio = PRIORITIES[min(rank + 1, top)]
+            escalated.append(
+                {
+                    "ticket_id": tid,
+                    "before": prio,
+                    "after": new_prio,
+                    "breached_due_at": due,
+                    "next_due_at": sla_due_at(rearmed_at, "", new_prio, rearmed_at=rearmed_at),
+                }
+            )
+
+        if escalated:
+            ts = now_iso()
+            cur.executemany(
+                "UPDATE tickets SET priority=?, priority_rank=?, sla_due_at=?, sla_rearmed_at=?, updated_at=? WHERE ticket_id=?",
+                [(e["after"], PRIORITY_RANK[e["after"]], e["next_due_at"], rearmed_at, ts, e["ticket_id"]) for e in escalated],
+            )
+            write_audit_many(
+                [
+                    ("ticket", e["ticket_id"], "SLA_ESCALATED", actor_name, {k: v for k, v in e.items() if k != "ticket_id"})
+                    for e in escalated
+                ],
+                cur=cur,
+            )
+        c.commit()
+    except Exception:
+        c.rollback()
+        raise
+    finally:
+        c.close()
+    return escalated
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="SLA scheduler")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("escalate", help="bump priority on breached SLAs")
+    n = sub.add_parser("next", help="next ticket for an assignee")
+    n.add_argument("assignee")
+    d = sub.add_parser("due", help="tickets due within N hours")
+    d.add_argument("--hours", type=float, default=24)
+    args = parser.parse_args(argv)
+
+    ensure_db()
+    backfill_sla()
+    if args.cmd == "escalate":
+        print(json.dumps(escalate_breached(), indent=2))
+    elif args.cmd == "next":
+        print(json.dumps(next_ticket_for(args.assignee), indent=2))
+    else:
+        for t in due_soon(args.hours):
+            print(f"{t['sla_due_at']}  {t['ticket_id']}  {t['priority']:<8}  {t['assignee']}")
+
+
+if __name__ == "__main__":
+    main()
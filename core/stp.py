@@ -0,0 +1,281 @@
+import argparse
+import hashlib
+import json
+import statistics
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from core.config import get_section
+from core.data import build_routing_index, load_json
+from core.db import email_shard, ensure_db, now_iso, shard_conn, shard_names, upsert_review_state, write_audit_many
+from core.master_data import master_fills, master_index
+from core.overlay import materialize, suggestions_from_cache
+from core.rules import missing_required_fields
+from core.templates import draft_for, render_title
+from core.threads import thread_ticket_for_email
+from core.tickets_full import _chunks, insert_ticket
+
+
+# Straight-through processing: at intake, emails the agent is confident about
+# are approved and ticketed without a reviewer. An email qualifies when
+#   - STP is enabled and its request type has a threshold in [stp.min_confidence],
+#   - classification.confidence meets that threshold,
+#   - no required field is missing and (by default) no risk flag is raised,
+#   - the suggested queue does not require controller approval,
+#   - it is not a follow-up to a thread that already has a ticket,
+#   - and it is not drawn into the QA holdback sample.
+# Every evaluated email gets one stp_decisions row, so intake never re-decides it.
+# The row lives in the email's shard and commits with the ticket it creates.
+
+ACTOR = "STP"
+AUTO_APPROVED = "AUTO_APPROVED"
+QA_HOLDBACK = "QA_HOLDBACK"
+MANUAL = "MANUAL"
+
+
+def stp_settings() -> dict:
+    cfg = get_section("stp")
+    return {
+        "enabled": bool(cfg.get("enabled", False)),
+        "qa_sample_rate": float(cfg.get("qa_sample_rate", 0.1)),
+        "block_on_risk_flags": bool(cfg.get("block_on_risk_flags", True)),
+        "manual_review_minutes": float(cfg.get("manual_review_minutes", 6)),
+        "min_confidence": {k: float(v) for k, v in cfg.get("min_confidence", {}).items()},
+    }
+
+
+def in_qa_sample(email_id: str, rate: float) -> bool:
+    # Deterministic: the same email always lands on the same side, on every
+    # process and in every replay, so the holdback is auditable.
+    digest = hashlib.sha256(f"stp-qa:{email_id}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64 < rate
+
+
+def evaluate(email: dict, finalized: dict, queue_by_name: Dict[str, dict], settings: dict) -> dict:
+    # `finalized` is the overlay view (suggestion plus master-data fills).
+    classification = finalized["classification"]
+    req_type = classification["request_type"]
+    confidence = float(classification.get("confidence", 0.0))
+    decision = {"request_type": req_type, "confidence": confidence, "decision": MANUAL}
+
+    threshold = settings["min_confidence"].get(req_type)
+    queue = queue_by_name.get(finalized["routing"].get("queue"))
+    if threshold is None:
+        reason = "request type not enabled for STP"
+    elif confidence < threshold:
+        reason = f"confidence {confidence:.2f} below {threshold:.2f}"
+    elif missing_required_fields(req_type, finalized["extraction"]):
+        reason = "required fields missing"
+    elif settings["block_on_risk_flags"] and finalized["extraction"].get("risk_flags"):
+        reason = "risk flags raised"
+    elif queue is None:
+        reason = "unknown queue"
+    elif queue.get("requires_controller_approval"):
+        reason = "queue requires controller approval"
+    elif thread_ticket_for_email(email["email_id"]):
+        reason = "follow-up to an existing ticket"
+    elif in_qa_sample(email["email_id"], settings["qa_sample_rate"]):
+        decision["decision"] = QA_HOLDBACK
+        reason = "held back for QA review"
+    else:
+        decision["decision"] = AUTO_APPROVED
+        reason = f"confidence {confidence:.2f} >= {threshold:.2f}"
+    decision["reason"] = reason
+    return decision
+
+
+def _undecided(email_ids: List[str]) -> set:
+    # Skips anything already decided and anything a reviewer has opened or saved.
+    todo = set(email_ids)
+    for shard in shard_names():
+        c = shard_conn(shard)
+        cur = c.cursor()
+        for chunk in _chunks(sorted(todo)):
+            marks = ",".join("?" * len(chunk))
+            cur.execute(
+                f"""
+                SELECT email_id FROM stp_decisions WHERE email_id IN ({marks})
+                UNION SELECT email_id FROM review_state WHERE email_id IN ({marks})
+                UNION SELECT entity_id FROM audit_log WHERE entity_type='email' AND entity_id IN ({marks})
+                """,
+                chunk * 3,
+            )
+            todo.difference_update(r[0] for r in cur.fetchall())
+        c.close()
+    return todo
+
+
+def _record(email: dict, d: dict, finalized: dict, overrides: dict, actor_name: str):
+    # The decision and, for an auto-approval, the review state, ticket and audit
+    # events commit in one transaction on the email's shard (the ticket's shard
+    # too). If anything fails the email stays undecided and the next pass
+    # evaluates it again.
+    email_id = email["email_id"]
+    shard = email_shard(email_id)
+    details = {"request_type": d["request_type"], "confidence": d["confidence"], "reason": d["reason"]}
+    c = shard_conn(shard)
+    cur = c.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        events = []
+        if d["decision"] == AUTO_APPROVED:
+            # Same ticket the Approval page would create for an untouched suggestion.
+            req_type = finalized["classification"]["request_type"]
+            routing = finalized["routing"]
+            upsert_review_state(email_id, "TICKETED", overrides, cur=cur)
+            d["ticket_id"] = insert_ticket(
+                cur,
+                shard,
+                email_id=email_id,
+                status="Open",
+                title=render_title(req_type, finalized["extraction"]),
+                request_type=req_type,
+                queue=routing["queue"],
+                assignee=routing["assignee"],
+                priority=routing["priority"],
+                from_email=email["from"]["email"],
+                subject=email["subject"],
+                payload=finalized,
+            )
+            events.append(("email", email_id, "AUTO_APPROVED", actor_name, {**details, "ticket_id": d["ticket_id"]}))
+            events.append(("ticket", d["ticket_id"], "TICKET_CREATED_OR_UPDATED", actor_name, {"status": "Open", "source": "stp"}))
+        elif d["decision"] == QA_HOLDBACK:
+            events.append(("email", email_id, "STP_QA_HOLDBACK", actor_name, details))
+        cur.execute(
+            """
+            INSERT INTO stp_decisions(email_id, decided_at, decision, reason, request_type, confidence, ticket_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (email_id, now_iso(), d["decision"], d["reason"], d["request_type"], d["confidence"], d["ticket_id"]),
+        )
+        write_audit_many(events, cur=cur)
+        c.commit()
+    except Exception:
+        c.rollback()
+        d["ticket_id"] = None
+        raise
+    finally:
+        c.close()
+
+
+def run_stp(emails: List[dict], agent_cache: Dict, demo_users: Dict, actor_name: str = ACTOR) -> List[dict]:
+    # Incremental like core.threads.index_threads: only undecided, untouched
+    # emails are evaluated. Returns the decisions made in this pass.
+    settings = stp_settings()
+    if not settings["enabled"]:
+        return []
+    queue_by_name = build_routing_index(demo_users)["queue_by_name"]
+    masters = master_index()
+
+    todo = _undecided([e["email_id"] for e in emails])
+
+    decisions = []
+    for e in sorted(emails, key=lambda e: e["received_at"]):
+        cached = agent_cache.get(e["email_id"])
+        if e["email_id"] not in todo or not cached:
+            continue
+        base = suggestions_from_cache(cached)
+        overrides = {}
+        if masters:
+            # Only ID and normalized-name matches may complete the required fields here.
+            master_fills(base, overrides, masters, exact_only=True)
+        finalized = materialize(base, overrides)
+        finalized["draft_response"] = draft_for(e, finalized["classification"]["request_type"], finalized["extraction"], finalized["draft_response"])
+        d = evaluate(e, finalized, queue_by_name, settings)
+        d["email_id"] = e["email_id"]
+        d["ticket_id"] = None
+        _record(e, d, finalized, overrides, actor_name)
+        decisions.append(d)
+    return decisions
+
+
+def get_decision(email_id: str) -> Optional[dict]:
+    c = shard_conn(email_shard(email_id))
+    cur = c.cursor()
+    cur.execute("SELECT decision, reason, decided_at, ticket_id FROM stp_decisions WHERE email_id=?", (email_id,))
+    row = cur.fetchone()
+    c.close()
+    return {"decision": row[0], "reason": row[1], "decided_at": row[2], "ticket_id": row[3]} if row else None
+
+
+def _manual_review_seconds(cur) -> List[float]:
+    # Reviewer handling time per manually approved email: first open -> approval.
+    cur.execute(
+        """
+        SELECT MIN(CASE WHEN action='AGENT_LOADED' THEN timestamp END),
+               MAX(CASE WHEN action='APPROVED' THEN timestamp END)
+        FROM audit_log
+        WHERE entity_type='email' AND action IN ('AGENT_LOADED', 'APPROVED')
+        GROUP BY entity_id
+        """
+    )
+    out = []
+    for opened, approved in cur.fetchall():
+        if opened and approved and approved >= opened:
+            out.append((datetime.fromisoformat(approved) - datetime.fromisoformat(opened)).total_seconds())
+    return out
+
+
+def stp_metrics() -> dict:
+    settings = stp_settings()
+    # An email's decision and audit events all live in its shard, so per-shard
+    # counts add up.
+    by_type: Dict[str, dict] = {}
+    manual_reasons: Counter = Counter()
+    manual_approved = 0
+    review_seconds: List[float] = []
+    for shard in shard_names():
+        c = shard_conn(shard)
+        cur = c.cursor()
+        cur.execute("SELECT request_type, decision, COUNT(*) FROM stp_decisions GROUP BY request_type, decision")
+        for req_type, decision, n in cur.fetchall():
+            row = by_type.setdefault(req_type, {"request_type": req_type, AUTO_APPROVED: 0, QA_HOLDBACK: 0, MANUAL: 0})
+            row[decision] += n
+        cur.execute("SELECT reason, COUNT(*) FROM stp_decisions WHERE decision=? GROUP BY reason", (MANUAL,))
+        manual_reasons.update(dict(cur.fetchall()))
+        cur.execute("SELECT COUNT(DISTINCT entity_id) FROM audit_log WHERE entity_type='email' AND action='APPROVED'")
+        manual_approved += cur.fetchone()[0]
+        review_seconds.extend(_manual_review_seconds(cur))
+        c.close()
+
+    auto = sum(r[AUTO_APPROVED] for r in by_type.values())
+    held = sum(r[QA_HOLDBACK] for r in by_type.values())
+    measured = statistics.median(review_seconds) if review_seconds else None
+    per_email = measured if measured is not None else settings["manual_review_minutes"] * 60
+    approvals = auto + manual_approved
+    return {
+        "auto_approved": auto,
+        "qa_holdback": held,
+        "manual_routed": sum(r[MANUAL] for r in by_type.values()),
+        "manual_approved": manual_approved,
+        "auto_rate": auto / approvals if approvals else 0.0,
+        "median_manual_review_seconds": measured,
+        "latency_saved_hours": auto * per_email / 3600,
+        "by_request_type": sorted(by_type.values(), key=lambda r: r["request_type"]),
+        "manual_reasons": dict(manual_reasons.most_common()),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Straight-through processing")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("run", help="evaluate undecided inbox emails now")
+    sub.add_parser("metrics", help="auto vs manual rates and latency saved")
+    args = parser.parse_args(argv)
+
+    ensure_db()
+    if args.cmd == "run":
+        decisions = run_stp(
+            load_json("data/inbox_emails.json"),
+            load_json("data/agent_cache.json"),
+            load_json("data/demo_users.json"),
+        )
+        for d in decisions:
+            print(f"{d['email_id']}  {d['decision']:<14}  {d['reason']}")
+    else:
+        print(json.dumps(stp_metrics(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from jinja2 import Environment, Template
+
+from core.rules import missing_required_fields
+
+
+# Template fast path for routine requests: ticket titles and reply drafts are
+# rendered from precompiled Jinja2 templates keyed by request_type and by
+# whether required fields are missing. Unusual cases keep the agent's (LLM)
+# draft; see draft_for().
+
+_ENV = Environment(autoescape=False, trim_blocks=True, lstrip_blocks=True, keep_trailing_newline=False)
+
+TITLE_TEMPLATES: Dict[str, str] = {
+    "AP_INVOICE_PROCESSING": "{{ f.vendor_name or 'Vendor' }} invoice {{ f.invoice_number or '' }}",
+    "AP_VENDOR_PAYMENT_INQUIRY": "Payment status – {{ f.vendor_name or 'Vendor' }} INV {{ f.invoice_number or '?' }}",
+    "AP_VENDOR_MASTERDATA_CHANGE": "Vendor master change – {{ f.vendor_name or 'Vendor' }}{% if f.change_type %} ({{ f.change_type }}){% endif %}",
+    "AP_3WAY_MATCH_EXCEPTION": "3-way match exception – PO {{ f.po_number or '?' }} / INV {{ f.invoice_number or '?' }}",
+    "EXPENSE_REIMBURSEMENT_ISSUE": "Expense report {{ f.expense_report_id or '?' }}{% if f.employee_id %} (employee {{ f.employee_id }}){% endif %}",
+    "AR_CUSTOMER_INVOICE_REQUEST": "Customer invoice request – {{ f.customer_name or 'Customer' }}{% if f.po_number %} PO {{ f.po_number }}{% endif %}",
+    "AR_CASH_APPLICATION": "Cash reapplication – {{ f.currency or '' }} {{ money(f.payment_amount) }}{% if f.bank_reference %} ref {{ f.bank_reference }}{% endif %}",
+    "AR_CREDIT_MEMO_REQUEST": "Credit memo – {{ f.customer_name or 'Customer' }} INV {{ f.invoice_number or '?' }}",
+    "GL_JOURNAL_ENTRY_REQUEST": "Journal entry – Dr {{ f.debit_account or '?' }} / Cr {{ f.credit_account or '?' }}{% if f.effective_date %} eff. {{ f.effective_date }}{% endif %}",
+    "CLOSE_SUPPORT_REQUEST": "Close support – {{ f.account or 'account' }} variance",
+}
+DEFAULT_TITLE = "{{ x.free_text_summary or 'Finance request' }}"
+
+# One acknowledgement sentence per request type; the reply frame is shared.
+ACK_LINES: Dict[str, str] = {
+    "AP_INVOICE_PROCESSING": "we received invoice {{ f.invoice_number or '' }}{% if f.po_number %} for {{ f.po_number }}{% endif %}{% if f.invoice_amount %} ({{ f.currency or '' }} {{ money(f.invoice_amount) }}){% endif %} and will validate and process it through AP.",
+    "AP_VENDOR_PAYMENT_INQUIRY": "we are checking the payment status of invoice {{ f.invoice_number or '' }} and will confirm the expected payment date.",
+    "AP_VENDOR_MASTERDATA_CHANGE": "we received your vendor master change request. For your security, changes are verified through a callback before they take effect.",
+    "AP_3WAY_MATCH_EXCEPTION": "we are reviewing the match exception on {{ f.po_number or 'the PO' }} / invoice {{ f.invoice_number or '' }}.",
+    "EXPENSE_REIMBURSEMENT_ISSUE": "we are reviewing expense report {{ f.expense_report_id or '' }}.",
+    "AR_CUSTOMER_INVOICE_REQUEST": "we are preparing the invoice for {{ f.customer_name or 'the customer' }}{% if f.po_number %} (PO {{ f.po_number }}){% endif %}.",
+    "AR_CASH_APPLICATION": "we are reviewing the application of payment {{ f.bank_reference or '' }}{% if f.payment_amount %} ({{ f.currency or '' }} {{ money(f.payment_amount) }}){% endif %}.",
+    "AR_CREDIT_MEMO_REQUEST": "we received your credit memo request for invoice {{ f.invoice_number or '' }} and are reviewing it.",
+    "GL_JOURNAL_ENTRY_REQUEST": "we received your journal entry request and have queued it for GL review.",
+    "CLOSE_SUPPORT_REQUEST": "we are pulling the analysis for {{ f.account or 'the account' }} and will follow up.",
+}
+DEFAULT_ACK = "we received your request and routed it to the right team."
+
+REPLY_FRAME = """Hi {{ first_name }},
+
+Thanks — {{ ack }}
+{% if questions %}
+
+To proceed, please confirm:
+{% for q in questions %}
+• {{ q }}
+{% endfor %}
+{% endif %}
+
+Regards,
+Finance Operations"""
+
+FIELD_QUESTIONS: Dict[str, str] = {
+    "entity_code": "The entity/company code this request belongs to.",
+    "invoice_date": "The invoice date (or confirm it is shown on the attached PDF).",
+    "invoice_number": "The invoice number.",
+    "vendor_name": "The legal vendor name.",
+    "vendor_id": "Your vendor ID with us.",
+    "po_number": "The purchase order number.",
+    "change_type": "What is changing (bank details, address, contact, …).",
+    "employee_id": "Your employee ID.",
+    "expense_report_id": "The expense report ID.",
+    "customer_name": "The customer's legal name.",
+    "invoice_amount": "The invoice amount and currency.",
+    "payment_amount": "The payment amount and currency.",
+    "bank_reference": "The bank/remittance reference of the payment.",
+    "requested_credit_amount": "The credit amount requested.",
+    "reason": "The reason for the credit.",
+    "effective_date": "The effective date of the entry.",
+    "amount": "The entry amount.",
+    "debit_account": "The account to debit.",
+    "credit_account": "The account to credit.",
+    "account": "The GL account in question.",
+    "variance_amount": "The variance amount you are seeing.",
+}
+
+# Types whose replies are formulaic enough to skip the LLM when nothing is missing.
+ROUTINE_TYPES = {
+    "AP_INVOICE_PROCESSING",
+    "AP_VENDOR_PAYMENT_INQUIRY",
+    "EXPENSE_REIMBURSEMENT_ISSUE",
+    "AR_CUSTOMER_INVOICE_REQUEST",
+    "AR_CASH_APPLICATION",
+}
+
+
+def _money(value) -> str:
+    try:
+        return f"{float(value):,.2f}"
+    except (TypeError, ValueError):
+        return str(value or "")
+
+
+_ENV.globals["money"] = _money
+
+
+@lru_cache(maxsize=None)
+def _compiled(kind: str, key: str) -> Template:
+    if kind == "title":
+        source = TITLE_TEMPLATES.get(key, DEFAULT_TITLE)
+    elif kind == "ack":
+        source = ACK_LINES.get(key, DEFAULT_ACK)
+    else:
+        source = REPLY_FRAME
+    return _ENV.from_string(source)
+
+
+def _squash(text: str) -> str:
+    return " ".join(text.split())
+
+
+def render_title(request_type: str, extraction: dict) -> str:
+    body = _compiled("title", request_type).render(f=extraction.get("fields") or {}, x=extraction)
+    return f"{request_type}: {_squash(body)}"
+
+
+def questions_for(missing: List[str]) -> List[str]:
+    return [FIELD_QUESTIONS.get(k, f"Please provide: {k}.") for k in missing]
+
+
+def render_draft(email: dict, request_type: str, extraction: dict, missing: Optional[List[str]] = None) -> dict:
+    if missing is None:
+        missing = missing_required_fields(request_type, extraction)
+    fields = extraction.get("fields") or {}
+    requester = (extraction.get("requester") or {}).get("name") or (email.get("from") or {}).get("name") or ""
+    questions = questions_for(missing)
+    ack = _squash(_compiled("ack", request_type).render(f=fields, x=extraction))
+    body = _compiled("reply", "frame").render(first_name=requester.split(" ")[0] or "there", ack=ack, questions=questions)
+    subject = email.get("subject", "")
+    return {
+        "subject": subject if subject.lower().startswith("re:") else f"Re: {subject}",
+        "body": body,
+        "questions_for_requester": questions,
+    }
+
+
+def is_routine(request_type: str, extraction: dict) -> bool:
+    return request_type in ROUTINE_TYPES and not missing_required_fields(request_type, extraction)
+
+
+def draft_for(email: dict, request_type: str, extraction: dict, agent_draft: Optional[dict]) -> dict:
+    # Routine requests always get the template; the agent's draft is kept for
+    # the rest, with the template as the fallback when there is none.
+    if agent_draft is None or is_routine(request_type, extraction):
+        return render_draft(email, request_type, extraction)
+    return agent_draft
@@ -0,0 +1,135 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+from core.db import conn, tickets_for_emails, write_audit_many
+
+
+# Conversation threading for the shared inbox. Each email is assigned a thread_id
+# (the email_id of the thread's first message) once, at ingest:
+#   1. Message-ID match on In-Reply-To / References, if the email carries them;
+#   2. otherwise, for replies/forwards only, the most recent email with the same
+#      normalized subject and participant set.
+# Both are indexed lookups, so ingest cost does not grow with inbox size.
+
+_PREFIX_RE = re.compile(r"^\s*(?:(?:re|fw|fwd|aw|sv|antw)\s*(?:\[\d+\])?\s*:\s*|\[external\]\s*)+", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_subject(subject: str) -> str:
+    return _SPACE_RE.sub(" ", _PREFIX_RE.sub("", subject or "")).strip().lower()
+
+
+def is_reply_subject(subject: str) -> bool:
+    return bool(_PREFIX_RE.match(subject or ""))
+
+
+def participants_key(email: dict) -> str:
+    addrs = {(email.get("from") or {}).get("email", "").lower()}
+    addrs.update(a.lower() for a in email.get("to") or [])
+    return ",".join(sorted(a for a in addrs if a))
+
+
+def _message_id(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip().strip("<>").strip()
+    return value or None
+
+
+def _parent_ids(email: dict) -> List[str]:
+    refs = email.get("references") or []
+    if isinstance(refs, str):
+        refs = refs.split()
+    # In-Reply-To first, then References newest to oldest.
+    ids = [email.get("in_reply_to")] + list(reversed(refs))
+    return [m for m in (_message_id(x) for x in ids) if m]
+
+
+def _find_thread(cur, email: dict, subject_key: str, people: str) -> Optional[str]:
+    parents = _parent_ids(email)
+    if parents:
+        marks = ",".join("?" * len(parents))
+        cur.execute(f"SELECT thread_id FROM email_threads WHERE message_id IN ({marks}) LIMIT 1", parents)
+        row = cur.fetchone()
+        if row:
+            return row[0]
+    if is_reply_subject(email.get("subject", "")):
+        cur.execute(
+            """
+            SELECT thread_id FROM email_threads
+            WHERE subject_key=? AND participants_key=? AND received_at <= ?
+            ORDER BY received_at DESC LIMIT 1
+            """,
+            (subject_key, people, email["received_at"]),
+        )
+        row = cur.fetchone()
+        if row:
+            return row[0]
+    return None
+
+
+def index_threads(emails: Iterable[dict], actor_name: str = "Threading") -> Dict[str, str]:
+    # Incremental: only emails not yet in email_threads are processed. Returns
+    # {email_id: thread_id} for the newly indexed emails.
+    c = conn()
+    cur = c.cursor()
+    cur.execute("SELECT email_id FROM email_threads")
+    known = {r[0] for r in cur.fetchall()}
+    new = sorted((e for e in emails if e["email_id"] not in known), key=lambda e: e["received_at"])
+    if not new:
+        c.close()
+        return {}
+
+    assigned: Dict[str, str] = {}
+    linked = []
+    try:
+        for e in new:
+            subject_key = normalize_subject(e.get("subject", ""))
+            people = participants_key(e)
+            thread_id = _find_thread(cur, e, subject_key, people) or e["email_id"]
+            cur.execute(
+                """
+                INSERT INTO email_threads(email_id, thread_id, message_id, subject_key, participants_key, received_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (e["email_id"], thread_id, _message_id(e.get("message_id")), subject_key, people, e["received_at"]),
+            )
+            assigned[e["email_id"]] = thread_id
+            if thread_id != e["email_id"]:
+                ticket_id = _thread_ticket(cur, thread_id)
+                if ticket_id:
+                    linked.append(("ticket", ticket_id, "FOLLOWUP_LINKED", actor_name, {"email_id": e["email_id"], "thread_id": thread_id}))
+        c.commit()
+    except Exception:
+        c.rollback()
+        raise
+    finally:
+        c.close()
+    # Ticket events live in the ticket's shard, so they are written separately.
+    write_audit_many(linked)
+    return assigned
+
+
+def _thread_ticket(cur, thread_id: str) -> Optional[str]:
+    # The thread's first ticket; tickets live in their email's shard.
+    cur.execute("SELECT email_id FROM email_threads WHERE thread_id=?", (thread_id,))
+    tickets = tickets_for_emails([r[0] for r in cur.fetchall()])
+    return min(tickets)[1] if tickets else None
+
+
+def thread_ticket_for_email(email_id: str) -> Optional[str]:
+    # The ticket opened for any message in this email's thread.
+    c = conn()
+    cur = c.cursor()
+    cur.execute("SELECT thread_id FROM email_threads WHERE email_id=?", (email_id,))
+    row = cur.fetchone()
+    ticket_id = _thread_ticket(cur, row[0]) if row else None
+    c.close()
+    return ticket_id
+
+
+def thread_map() -> Dict[str, str]:
+    c = conn()
+    cur = c.cursor()
+    cur.execute("SELECT email_id, thread_id FROM email_threads")
+    rows = cur.fetchall()
+    c.close()
+    return dict(rows)
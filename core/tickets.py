@@ -1,11 +1,11 @@
 import json
 from typing import Optional, Dict, List
 
-from core.db import conn, now_iso
+from core.db import email_shard, now_iso, shard_conn
 
 
 def ticket_exists_for_email(email_id: str) -> Optional[str]:
-    c = conn()
+    c = shard_conn(email_shard(email_id))
     cur = c.cursor()
     cur.execute("SELECT ticket_id FROM tickets WHERE email_id=? LIMIT 1", (email_id,))
     row = cur.fetchone()
@@ -14,7 +14,7 @@ def ticket_exists_for_email(email_id: str) -> Optional[str]:
 
 
 def get_ticket_status_for_email(email_id: str) -> Optional[str]:
-    c = conn()
+    c = shard_conn(email_shard(email_id))
     cur = c.cursor()
     cur.execute("SELECT status FROM tickets WHERE email_id=? LIMIT 1", (email_id,))
     row = cur.fetchone()
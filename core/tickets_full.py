@@ -1,12 +1,29 @@
+import heapq
 import json
 import sqlite3
+from itertools import islice
 from typing import Dict, List, Optional
 
-from core.db import conn, now_iso
+from core.db import (
+    email_shard,
+    now_iso,
+    shard_conn,
+    shard_names,
+    ticket_prefix,
+    ticket_shard,
+    ticket_shards,
+    write_audit_many,
+)
+from core.sla import priority_rank, sla_columns, sla_due_at
+from core.threads import thread_ticket_for_email
+
+
+TICKET_STATUSES = ["Open", "Waiting on Requester", "In Progress", "Resolved"]
+BULK_FIELDS = ("status", "assignee", "queue", "priority")
 
 
 def ticket_exists_for_email(email_id: str) -> Optional[str]:
-    c = conn()
+    c = shard_conn(email_shard(email_id))
     cur = c.cursor()
     cur.execute("SELECT ticket_id FROM tickets WHERE email_id=? LIMIT 1", (email_id,))
     row = cur.fetchone()
@@ -14,20 +31,43 @@ def ticket_exists_for_email(email_id: str) -> Optional[str]:
     return row[0] if row else None
 
 
-def next_ticket_id() -> str:
-    c = conn()
+def followup_parent(email_id: str) -> Optional[str]:
+    # The ticket opened for this email's thread, when the email is a follow-up
+    # without a ticket of its own.
+    if ticket_exists_for_email(email_id):
+        return None
+    return thread_ticket_for_email(email_id)
+
+
+def add_followup(ticket_id: str, email_id: str, actor_name: str, details: dict) -> bool:
+    # A follow-up is activity on the thread's ticket; the ticket keeps the
+    # original request's title, type and payload. A ticket waiting on the
+    # requester has its answer now and goes back to Open. Returns whether it did.
+    c = shard_conn(ticket_shard(ticket_id))
     cur = c.cursor()
-    cur.execute("SELECT ticket_id FROM tickets ORDER BY ticket_id DESC LIMIT 1")
-    row = cur.fetchone()
-    c.close()
-    if not row:
-        return "FIN-1001"
-    last = row[0]
     try:
-        n = int(last.split("-")[1])
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("SELECT status FROM tickets WHERE ticket_id=?", (ticket_id,))
+        row = cur.fetchone()
+        events = [("ticket", ticket_id, "FOLLOWUP_ADDED", actor_name, {"email_id": email_id, **details})]
+        reopened = bool(row) and row[0] == "Waiting on Requester"
+        if reopened:
+            cur.execute("UPDATE tickets SET status='Open', updated_at=? WHERE ticket_id=?", (now_iso(), ticket_id))
+            events.append(("ticket", ticket_id, "TICKET_CREATED_OR_UPDATED", actor_name, {"status": "Open", "source": "followup", "email_id": email_id}))
+        write_audit_many(events, cur=cur)
+        c.commit()
     except Exception:
-        n = 1000
-    return f"FIN-{n+1}"
+        c.rollback()
+        raise
+    finally:
+        c.close()
+    return reopened
+
+
+def next_ticket_id(cur: sqlite3.Cursor, shard: str) -> str:
+    # `cur` is on `shard`; the id is taken inside the caller's transaction.
+    cur.execute("UPDATE ticket_sequence SET value = value + 1 WHERE name='ticket' RETURNING value")
+    return f"{ticket_prefix(shard)}{cur.fetchone()[0]}"
 
 
 def create_or_update_ticket(
@@ -44,49 +84,98 @@ def create_or_update_ticket(
     payload: dict,
 ) -> str:
     existing = ticket_exists_for_email(email_id)
-    c = conn()
+    shard = ticket_shard(existing) if existing else email_shard(email_id)
+    c = shard_conn(shard)
     cur = c.cursor()
-
-    if existing:
-        cur.execute(
-            """
-            UPDATE tickets
-            SET updated_at=?,
-                status=?,
-                request_type=?,
-                queue=?,
-                assignee=?,
-                priority=?,
-                title=?,
-                from_email=?,
-                subject=?,
-                payload_json=?
-            WHERE ticket_id=?
-            """,
-            (
-                now_iso(),
-                status,
-                request_type,
-                queue,
-                assignee,
-                priority,
-                title,
-                from_email,
-                subject,
-                json.dumps(payload, ensure_ascii=False),
-                existing,
-            ),
-        )
+    try:
+        # The sequence bump (new ticket) or the read-modify-write (existing one)
+        # holds the shard's write lock until commit or rollback.
+        cur.execute("BEGIN IMMEDIATE")
+        if existing:
+            cur.execute("SELECT created_at, sla_rearmed_at FROM tickets WHERE ticket_id=?", (existing,))
+            created_at, rearmed_at = cur.fetchone()
+            sla = sla_columns(created_at, queue, priority, payload, rearmed_at)
+            cur.execute(
+                """
+                UPDATE tickets
+                SET updated_at=?,
+                    status=?,
+                    request_type=?,
+                    queue=?,
+                    assignee=?,
+                    priority=?,
+                    title=?,
+                    from_email=?,
+                    subject=?,
+                    payload_json=?,
+                    sla_due_at=?,
+                    priority_rank=?
+                WHERE ticket_id=?
+                """,
+                (
+                    now_iso(),
+                    status,
+                    request_type,
+                    queue,
+                    assignee,
+                    priority,
+                    title,
+                    from_email,
+                    subject,
+                    json.dumps(payload, ensure_ascii=False),
+                    sla["sla_due_at"],
+                    sla["priority_rank"],
+                    existing,
+                ),
+            )
+            ticket_id = existing
+        else:
+            ticket_id = insert_ticket(
+                cur,
+                shard,
+                email_id=email_id,
+                status=status,
+                title=title,
+                request_type=request_type,
+                queue=queue,
+                assignee=assignee,
+                priority=priority,
+                from_email=from_email,
+                subject=subject,
+                payload=payload,
+            )
         c.commit()
+    except Exception:
+        c.rollback()
+        raise
+    finally:
         c.close()
-        return existing
+    return ticket_id
+
 
-    ticket_id = next_ticket_id()
+def insert_ticket(
+    cur: sqlite3.Cursor,
+    shard: str,
+    *,
+    email_id: str,
+    status: str,
+    title: str,
+    request_type: str,
+    queue: str,
+    assignee: str,
+    priority: str,
+    from_email: str,
+    subject: str,
+    payload: dict,
+) -> str:
+    # A new ticket inside the caller's transaction; `cur` is on the email's shard.
+    ticket_id = next_ticket_id(cur, shard)
     ts = now_iso()
+    sla = sla_columns(ts, queue, priority, payload)
     cur.execute(
         """
-        INSERT INTO tickets(ticket_id, email_id, created_at, updated_at, status, request_type, queue, assignee, priority, title, from_email, subject, payload_json)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO tickets(ticket_id, email_id, created_at, updated_at, status, request_type, queue, assignee, priority, title, from_email, subject, payload_json, sla_due_at, priority_rank)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
             ticket_id,
@@ -102,18 +191,14 @@ def create_or_update_ticket(
             from_email,
             subject,
             json.dumps(payload, ensure_ascii=False),
+            sla["sla_due_at"],
+            sla["priority_rank"],
         ),
     )
-    c.commit()
-    c.close()
     return ticket_id
 
 
-def list_tickets(filters: dict) -> List[dict]:
-    c = conn()
-    c.row_factory = sqlite3.Row
-    cur = c.cursor()
-
+def _ticket_where(filters: dict):
     where = []
     params = []
 
@@ -126,24 +211,178 @@ def list_tickets(filters: dict) -> List[dict]:
     if filters.get("assignee") and filters["assignee"] != "All":
         where.append("assignee=?")
         params.append(filters["assignee"])
+    return (" WHERE " + " AND ".join(where) if where else ""), params
 
-    sql = "SELECT * FROM tickets"
-    if where:
-        sql += " WHERE " + " AND ".join(where)
-    sql += " ORDER BY updated_at DESC"
 
-    cur.execute(sql, params)
-    rows = cur.fetchall()
-    c.close()
-    return [dict(r) for r in rows]
+def _ticket_order(filters: dict):
+    # (ORDER BY clause, merge key, reverse) shared by the SQL and the cross-shard merge.
+    if filters.get("sort") == "due_soon":
+        # Workable tickets by SLA deadline, then waiting/resolved ones.
+        return (
+            "ORDER BY CASE WHEN status IN ('Open', 'In Progress') THEN 0 ELSE 1 END, sla_due_at IS NULL, sla_due_at ASC, priority_rank DESC",
+            lambda t: (0 if t["status"] in ("Open", "In Progress") else 1, t["sla_due_at"] is None, t["sla_due_at"] or "", -t["priority_rank"]),
+            False,
+        )
+    return "ORDER BY updated_at DESC", lambda t: t["updated_at"], True
 
 
-def ticket_metrics() -> Dict[str, int]:
-    c = conn()
+def list_tickets(filters: dict) -> List[dict]:
+    where_sql, params = _ticket_where(filters)
+    order_sql, key, reverse = _ticket_order(filters)
+    limit = int(filters["limit"]) if filters.get("limit") else None
+    offset = int(filters.get("offset") or 0)
+
+    shards = shard_names()
+    sql = "SELECT * FROM tickets" + where_sql + " " + order_sql
+    if limit and len(shards) == 1:
+        sql += " LIMIT ? OFFSET ?"
+        params = params + [limit, offset]
+    elif limit:
+        # Each shard returns its own first offset+limit rows; the k-way merge
+        # below picks the global page from those.
+        sql += " LIMIT ?"
+        params = params + [offset + limit]
+
+    pages = []
+    for shard in shards:
+        c = shard_conn(shard)
+        c.row_factory = sqlite3.Row
+        pages.append([dict(r) for r in c.execute(sql, params).fetchall()])
+        c.close()
+    if len(pages) == 1:
+        return pages[0]
+    merged = heapq.merge(*pages, key=key, reverse=reverse)
+    return list(islice(merged, offset, offset + limit if limit else None))
+
+
+def count_tickets(filters: dict) -> int:
+    where_sql, params = _ticket_where(filters)
+    n = 0
+    for shard in shard_names():
+        c = shard_conn(shard)
+        n += int(c.execute("SELECT COUNT(*) FROM tickets" + where_sql, params).fetchone()[0])
+        c.close()
+    return n
+
+
+def get_ticket(ticket_id: str) -> Optional[dict]:
+    shard = ticket_shard(ticket_id)
+    if shard is None:
+        return None
+    c = shard_conn(shard)
+    c.row_factory = sqlite3.Row
     cur = c.cursor()
-    metrics = {}
-    for s in ["Open", "Waiting on Requester", "In Progress", "Resolved"]:
-        cur.execute("SELECT COUNT(*) FROM tickets WHERE status=?", (s,))
-        metrics[s] = int(cur.fetchone()[0])
+    cur.execute("SELECT * FROM tickets WHERE ticket_id=?", (ticket_id,))
+    row = cur.fetchone()
     c.close()
+    return dict(row) if row else None
+
+
+def ticket_ids_by_email() -> Dict[str, str]:
+    out: Dict[str, str] = {}
+    for shard in shard_names():
+        c = shard_conn(shard)
+        out.update(c.execute("SELECT email_id, ticket_id FROM tickets").fetchall())
+        c.close()
+    return out
+
+
+def ticket_metrics() -> Dict[str, int]:
+    metrics = {s: 0 for s in TICKET_STATUSES}
+    for shard in shard_names():
+        c = shard_conn(shard)
+        for status, n in c.execute("SELECT status, COUNT(*) FROM tickets GROUP BY status").fetchall():
+            if status in metrics:
+                metrics[status] += int(n)
+        c.close()
     return metrics
+
+
+def _chunks(items: list, size: int = 500):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def bulk_update_tickets(ticket_ids: List[str], changes: dict, actor_name: str) -> List[dict]:
+    unknown = set(changes) - set(BULK_FIELDS)
+    if unknown:
+        raise ValueError(f"Unsupported bulk fields: {', '.join(sorted(unknown))}")
+    changes = {k: v for k, v in changes.items() if v}
+    if changes.get("status") and changes["status"] not in TICKET_STATUSES:
+        raise ValueError(f"Unknown ticket status: {changes['status']}")
+
+    ids = list(dict.fromkeys(ticket_ids))
+    if not ids or not changes:
+        return [{"ticket_id": t, "ok": False, "changed": {}, "error": "No changes requested"} for t in ids]
+
+    # One transaction per shard; results keep the caller's order.
+    by_shard: Dict[str, List[str]] = {}
+    results: Dict[str, dict] = {}
+    for tid, shard in ticket_shards(ids).items():
+        if shard is None:
+            results[tid] = {"ticket_id": tid, "ok": False, "changed": {}, "error": "Ticket not found"}
+        else:
+            by_shard.setdefault(shard, []).append(tid)
+    for shard, shard_ids in by_shard.items():
+        results.update(_bulk_update_shard(shard, shard_ids, changes, actor_name))
+    return [results[tid] for tid in ids]
+
+
+def _bulk_update_shard(shard: str, ids: List[str], changes: dict, actor_name: str) -> Dict[str, dict]:
+    c = shard_conn(shard)
+    c.row_factory = sqlite3.Row
+    cur = c.cursor()
+    try:
+        # Take the write lock up front so the read-compare-write below is consistent.
+        cur.execute("BEGIN IMMEDIATE")
+        current = {}
+        for chunk in _chunks(ids):
+            marks = ",".join("?" * len(chunk))
+            cur.execute(
+                f"""
+                SELECT ticket_id, status, queue, assignee, priority, created_at, sla_rearmed_at,
+                       json_extract(payload_json, '$.extraction.due_date') AS due_date
+                FROM tickets WHERE ticket_id IN ({marks})
+                """,
+                chunk,
+            )
+            for row in cur.fetchall():
+                current[row["ticket_id"]] = row
+
+        results = {}
+        to_update = []
+        audits = []
+        for tid in ids:
+            row = current.get(tid)
+            if row is None:
+                results[tid] = {"ticket_id": tid, "ok": False, "changed": {}, "error": "Ticket not found"}
+                continue
+            changed = {k: {"before": row[k], "after": v} for k, v in changes.items() if row[k] != v}
+            results[tid] = {"ticket_id": tid, "ok": True, "changed": changed, "error": None}
+            if changed:
+                to_update.append(tid)
+                audits.append(("ticket", tid, "TICKET_BULK_UPDATED", actor_name, {"changes": changed}))
+
+        if to_update:
+            ts = now_iso()
+            assignments = ", ".join(f"{k}=?" for k in changes)
+            values = tuple(changes.values())
+            params = []
+            for tid in to_update:
+                row = current[tid]
+                queue = changes.get("queue", row["queue"])
+                priority = changes.get("priority", row["priority"])
+                due = sla_due_at(row["created_at"], queue, priority, row["due_date"], row["sla_rearmed_at"])
+                params.append((ts, *values, due, priority_rank(priority), tid))
+            cur.executemany(
+                f"UPDATE tickets SET updated_at=?, {assignments}, sla_due_at=?, priority_rank=? WHERE ticket_id=?",
+                params,
+            )
+            write_audit_many(audits, cur=cur)
+        c.commit()
+    except Exception:
+        c.rollback()
+        raise
+    finally:
+        c.close()
+    return results
@@ -1,22 +1,17 @@
 import json
+from typing import Optional
+
 import streamlit as st
 
 from core.db import get_review_state, upsert_review_state, write_audit
-from core.tickets_full import create_or_update_ticket  # we’ll create this file next
-
-
-REQUEST_TYPES = [
-    "AP_INVOICE_PROCESSING",
-    "AP_VENDOR_PAYMENT_INQUIRY",
-    "AP_VENDOR_MASTERDATA_CHANGE",
-    "EXPENSE_REIMBURSEMENT_ISSUE",
-    "AR_CUSTOMER_INVOICE_REQUEST",
-    "AR_CASH_APPLICATION",
-    "AR_CREDIT_MEMO_REQUEST",
-    "GL_JOURNAL_ENTRY_REQUEST",
-    "AP_3WAY_MATCH_EXCEPTION",
-    "CLOSE_SUPPORT_REQUEST",
-]
+from core.master_data import master_fills, master_index, match_name
+from core.overlay import diff, get_value, materialize, set_value, suggestions_from_cache
+from core.rules import REQUEST_TYPES, missing_required_fields, required_fields
+from core.stp import AUTO_APPROVED, QA_HOLDBACK, get_decision
+from core.templates import draft_for, questions_for, render_draft, render_title
+from core.tickets_full import add_followup, create_or_update_ticket, followup_parent  # we’ll create this file next
+from ui.startup import routing_index
+from ui.timeline import render_timeline
 
 
 def pill(text: str, bg: str, fg: str = "white") -> str:
@@ -44,57 +39,53 @@ def status_color(status: str) -> str:
     }.get(status, "#334155")
 
 
-def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name: str = "Demo Reviewer"):
+def render_approval(email: Optional[dict], cached: Optional[dict], demo_users: dict, reviewer_name: str = "Demo Reviewer"):
+    # core.email_store returns None for ids it does not hold, e.g. after the
+    # inbox file was reloaded without them.
+    if email is None:
+        st.info("This email is no longer in the inbox. Pick one from the Inbox page.")
+        return
+    if cached is None:
+        st.info("No agent suggestions for this email yet.")
+        return
     email_id = email["email_id"]
 
+    # Agent suggestions are shared and never mutated; reviewer edits live in a
+    # sparse per-email overrides dict (see core.overlay).
+    base = suggestions_from_cache(cached)
+    base["draft_response"] = draft_for(email, base["classification"]["request_type"], base["extraction"], base["draft_response"])
+
     # Load from DB if present
-    db_state = get_review_state(email_id)
-    if "finalized" not in st.session_state or st.session_state.get("active_email_id") != email_id:
+    if st.session_state.get("review_email_id") != email_id:
+        db_state = get_review_state(email_id)
+        st.session_state.review_email_id = email_id
         st.session_state.active_email_id = email_id
+        st.session_state.review_stp = get_decision(email_id)
         if db_state:
-            st.session_state.finalized = db_state["finalized"]
+            if "overrides" in db_state:
+                st.session_state.review_overrides = db_state["overrides"]
+            else:
+                st.session_state.review_overrides = diff(base, db_state["finalized"])
             st.session_state.review_status = db_state["review_status"]
         else:
-            st.session_state.finalized = {
-                "classification": cached["classification"],
-                "extraction": cached["extraction"],
-                "routing": cached["routing_suggestion"],
-                "draft_response": cached["draft_response"],
-                "overrides": {"routing_overridden": False, "override_reason": ""},
-            }
+            st.session_state.review_overrides = {}
             st.session_state.review_status = "NEW"
             write_audit("email", email_id, "AGENT_LOADED", reviewer_name, {"source": "agent_cache"})
+            masters = master_index()
+            fills = master_fills(base, st.session_state.review_overrides, masters) if masters else []
+            if any(f["filled"] for f in fills):
+                write_audit("email", email_id, "MASTER_DATA_MATCHED", "Master Data", {"matches": fills})
 
-    finalized = st.session_state.finalized
+    overrides = st.session_state.review_overrides
+    finalized = materialize(base, overrides)
     extraction = finalized["extraction"]
     fields = extraction["fields"]
 
-    # Required missing for this demo (keep minimal)
-    REQUIRED_BY_TYPE = {
-    "AP_INVOICE_PROCESSING": ["entity_code", "invoice_date", "invoice_number", "vendor_name", "po_number"],
-    "AP_VENDOR_PAYMENT_INQUIRY": ["entity_code", "invoice_number", "vendor_name"],
-    "AP_VENDOR_MASTERDATA_CHANGE": ["entity_code", "vendor_name", "vendor_id", "change_type"],
-    "AP_3WAY_MATCH_EXCEPTION": ["entity_code", "po_number", "invoice_number"],
-    "EXPENSE_REIMBURSEMENT_ISSUE": ["entity_code", "employee_id", "expense_report_id"],
-    "AR_CUSTOMER_INVOICE_REQUEST": ["entity_code", "customer_name", "po_number", "invoice_amount"],
-    "AR_CASH_APPLICATION": ["entity_code", "payment_amount", "bank_reference"],
-    "AR_CREDIT_MEMO_REQUEST": ["entity_code", "customer_name", "invoice_number", "requested_credit_amount", "reason"],
-    "GL_JOURNAL_ENTRY_REQUEST": ["entity_code", "effective_date", "amount", "debit_account", "credit_account"],
-    "CLOSE_SUPPORT_REQUEST": ["entity_code", "account", "variance_amount"]
-    }
     req_type = finalized["classification"]["request_type"]
-    required = REQUIRED_BY_TYPE.get(req_type, ["entity_code"])
-
-    required_missing = []
-    for k in required:
-        if k == "entity_code":
-            if not extraction.get("entity_code"):
-                required_missing.append("entity_code")
-        else:
-            if not fields.get(k):
-                required_missing.append(k)
+    required = required_fields(req_type)
+    required_missing = missing_required_fields(req_type, extraction)
 
-    total_required = 2
+    total_required = len(required)
     complete = total_required - len(required_missing)
     completeness = complete / total_required if total_required else 1.0
 
@@ -123,6 +114,11 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
             pill(f"STATUS: {st.session_state.review_status}", status_color(st.session_state.review_status)),
             unsafe_allow_html=True,
         )
+        stp = st.session_state.get("review_stp") or {}
+        if stp.get("decision") == AUTO_APPROVED:
+            st.markdown(pill("AUTO-APPROVED (STP)", "#6d28d9"), unsafe_allow_html=True)
+        elif stp.get("decision") == QA_HOLDBACK:
+            st.markdown(pill("QA SAMPLE", "#a16207"), unsafe_allow_html=True)
         if required_missing:
             st.markdown(pill("BLOCKED: MISSING INFO", "#991b1b"), unsafe_allow_html=True)
         else:
@@ -140,19 +136,13 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
         top_reset = st.button("↩️ Reset to Suggested", use_container_width=True)
 
     if top_reset:
-        st.session_state.finalized = {
-            "classification": cached["classification"],
-            "extraction": cached["extraction"],
-            "routing": cached["routing_suggestion"],
-            "draft_response": cached["draft_response"],
-            "overrides": {"routing_overridden": False, "override_reason": ""},
-        }
+        st.session_state.review_overrides = {}
         st.session_state.review_status = "NEW"
         write_audit("email", email_id, "RESET_TO_SUGGESTED", reviewer_name, {})
         st.rerun()
 
     if top_save:
-        upsert_review_state(email_id, "PENDING_APPROVAL", st.session_state.finalized)
+        upsert_review_state(email_id, "PENDING_APPROVAL", overrides)
         st.session_state.review_status = "PENDING_APPROVAL"
         write_audit("email", email_id, "DRAFT_SAVED", reviewer_name, {})
         st.success("Draft saved (not ticketed).")
@@ -193,7 +183,7 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
             new_req_type = st.selectbox("Request type", REQUEST_TYPES, index=REQUEST_TYPES.index(req_type))
             if new_req_type != req_type:
                 before = req_type
-                finalized["classification"]["request_type"] = new_req_type
+                set_value(base, overrides, "classification.request_type", new_req_type)
                 write_audit("email", email_id, "CLASSIFICATION_CHANGED", reviewer_name, {"before": before, "after": new_req_type})
 
             st.markdown("**Rationale**")
@@ -209,21 +199,26 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
             def set_field(path: str, before, after):
                 if before != after:
                     write_audit("email", email_id, "FIELD_EDITED", reviewer_name, {"field_path": path, "before": before, "after": after})
+                    set_value(base, overrides, path, after)
 
             set_field("extraction.requester.name", extraction["requester"]["name"], requester_name)
             set_field("extraction.requester.email", extraction["requester"]["email"], requester_email)
             set_field("extraction.entity_code", extraction.get("entity_code"), entity_code or None)
             set_field("extraction.due_date", extraction.get("due_date"), due_date or None)
 
-            extraction["requester"]["name"] = requester_name
-            extraction["requester"]["email"] = requester_email
-            extraction["entity_code"] = entity_code or None
-            extraction["due_date"] = due_date or None
-
             st.divider()
             st.markdown("**AP Invoice fields**")
 
             vendor_name = st.text_input("Vendor name", value=fields.get("vendor_name") or "")
+            masters = master_index()
+            for kind in ("vendor", "customer"):
+                name = vendor_name if kind == "vendor" else fields.get("customer_name")
+                match = match_name(masters, kind, name) if masters and name else None
+                if match:
+                    rec = match["record"]
+                    st.caption(f"Master {kind}: **{rec['name']}** · {rec['id']} · entity {rec['entity_code'] or '—'} ({match['method']}, {match['score']:.2f})")
+                elif name:
+                    st.caption(f"No {kind} master record matches “{name}”.")
             invoice_number = st.text_input("Invoice #", value=fields.get("invoice_number") or "")
             cA, cB = st.columns(2)
             with cA:
@@ -242,24 +237,11 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
             set_field("extraction.fields.service_period", fields.get("service_period"), service_period or None)
             set_field("extraction.fields.invoice_date", fields.get("invoice_date"), invoice_date or None)
 
-            fields["vendor_name"] = vendor_name or None
-            fields["invoice_number"] = invoice_number or None
-            fields["invoice_amount"] = float(invoice_amount)
-            fields["currency"] = currency or None
-            fields["po_number"] = po_number or None
-            fields["service_period"] = service_period or None
-            fields["invoice_date"] = invoice_date or None
-
         with tab3:
-            missing = []
-            if not extraction.get("entity_code"):
-                missing.append("entity_code")
-            if not fields.get("invoice_date"):
-                missing.append("invoice_date")
-
-            st.markdown("**Required missing**")
-            if missing:
-                st.error("Missing: " + ", ".join(missing))
+            # Same rule as the header pill and the approve gate (core.rules).
+            st.markdown(f"**Required missing** ({req_type}: {', '.join(required) or 'none'})")
+            if required_missing:
+                st.error("Missing: " + ", ".join(required_missing))
             else:
                 st.success("All required fields present.")
 
@@ -284,13 +266,14 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
         tabR, tabD, tabT = st.tabs(["Routing", "Draft Reply", "Ticket Preview"])
 
         with tabR:
-            queue_names = [q["display_name"] for q in demo_users["queues"]]
+            ridx = routing_index()
+            queue_names = ridx["queue_names"]
             current_queue = routing["queue"]
             queue_idx = queue_names.index(current_queue) if current_queue in queue_names else 0
             new_queue = st.selectbox("Queue", queue_names, index=queue_idx)
 
-            queue_id = next((q["queue_id"] for q in demo_users["queues"] if q["display_name"] == new_queue), None)
-            allowed_assignees = [a["name"] for a in demo_users["assignees"] if queue_id in a["queues"]] or [routing["assignee"]]
+            queue_id = ridx["queue_id_by_name"].get(new_queue)
+            allowed_assignees = ridx["assignees_by_queue"].get(queue_id) or [routing["assignee"]]
             assignee_idx = allowed_assignees.index(routing["assignee"]) if routing["assignee"] in allowed_assignees else 0
             new_assignee = st.selectbox("Assignee", allowed_assignees, index=assignee_idx)
 
@@ -298,28 +281,29 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
             pr_idx = priorities.index(routing["priority"]) if routing["priority"] in priorities else 1
             new_priority = st.selectbox("Priority", priorities, index=pr_idx)
 
-            routing_changed = (new_queue != routing["queue"]) or (new_assignee != routing["assignee"]) or (new_priority != routing["priority"])
+            suggested = base["routing"]
+            routing_changed = (new_queue, new_assignee, new_priority) != (suggested["queue"], suggested["assignee"], suggested["priority"])
             if routing_changed:
-                finalized["overrides"]["routing_overridden"] = True
-                override_reason = st.selectbox("Override reason (required)", demo_users["override_reasons"], index=0)
-                finalized["overrides"]["override_reason"] = override_reason
+                set_value(base, overrides, "overrides.routing_overridden", True)
+                reasons = demo_users["override_reasons"]
+                current_reason = get_value(base, overrides, "overrides.override_reason")
+                reason_idx = reasons.index(current_reason) if current_reason in reasons else 0
+                override_reason = st.selectbox("Override reason (required)", reasons, index=reason_idx)
+                set_value(base, overrides, "overrides.override_reason", override_reason)
                 st.warning("Routing overridden — reason will be logged.")
             else:
-                finalized["overrides"]["routing_overridden"] = False
-                finalized["overrides"]["override_reason"] = ""
+                set_value(base, overrides, "overrides.routing_overridden", False)
+                set_value(base, overrides, "overrides.override_reason", "")
 
             def audit_routing(field: str, before, after):
                 if before != after:
                     write_audit("email", email_id, "ROUTING_CHANGED", reviewer_name, {"field": field, "before": before, "after": after})
+                    set_value(base, overrides, f"routing.{field}", after)
 
             audit_routing("queue", routing["queue"], new_queue)
             audit_routing("assignee", routing["assignee"], new_assignee)
             audit_routing("priority", routing["priority"], new_priority)
 
-            routing["queue"] = new_queue
-            routing["assignee"] = new_assignee
-            routing["priority"] = new_priority
-
         with tabD:
             st.markdown(pill("DRAFT — NOT SENT", "#0f172a"), unsafe_allow_html=True)
             new_subj = st.text_input("Subject", value=draft["subject"])
@@ -327,18 +311,32 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
 
             if new_subj != draft["subject"]:
                 write_audit("email", email_id, "DRAFT_EDITED", reviewer_name, {"field": "subject", "before": draft["subject"], "after": new_subj})
-                draft["subject"] = new_subj
+                set_value(base, overrides, "draft_response.subject", new_subj)
             if new_body != draft["body"]:
                 write_audit("email", email_id, "DRAFT_EDITED", reviewer_name, {"field": "body", "before": "(previous)", "after": "(updated)"})
-                draft["body"] = new_body
+                set_value(base, overrides, "draft_response.body", new_body)
+
+            if st.button("⚡ Use template reply", use_container_width=True):
+                tpl = render_draft(email, finalized["classification"]["request_type"], extraction, required_missing)
+                for key in ("subject", "body", "questions_for_requester"):
+                    set_value(base, overrides, f"draft_response.{key}", tpl[key])
+                write_audit("email", email_id, "DRAFT_EDITED", reviewer_name, {"field": "template", "before": "(previous)", "after": "(template)"})
+                st.rerun()
 
             if required_missing:
                 st.markdown("**Questions (auto-generated)**")
-                for q in draft.get("questions_for_requester", []):
+                for q in draft.get("questions_for_requester") or questions_for(required_missing):
                     st.write(f"- {q}")
 
+        # Rebuild the view so the preview and actions see this run's edits.
+        finalized = materialize(base, overrides)
+        extraction = finalized["extraction"]
+        fields = extraction["fields"]
+        routing = finalized["routing"]
+
+        title_default = render_title(finalized["classification"]["request_type"], extraction)
+
         with tabT:
-            title_default = f"{finalized['classification']['request_type']}: {fields.get('vendor_name') or 'Vendor'} invoice {fields.get('invoice_number') or ''}".strip()
             st.text_input("Title", value=title_default)
             with st.expander("Ticket description (preview)", expanded=False):
                 st.code(
@@ -370,6 +368,14 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
                 unsafe_allow_html=True,
             )
 
+        def followup_details(review_status: str) -> dict:
+            return {
+                "review_status": review_status,
+                "subject": email["subject"],
+                "from_email": email["from"]["email"],
+                "summary": extraction.get("free_text_summary"),
+            }
+
         a1, a2 = st.columns(2)
         with a1:
             request_info = st.button("❓ Request More Info", use_container_width=True)
@@ -380,37 +386,16 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
 
         if request_info:
             st.session_state.review_status = "NEEDS_INFO"
-            upsert_review_state(email_id, "NEEDS_INFO", st.session_state.finalized)
+            upsert_review_state(email_id, "NEEDS_INFO", overrides)
             write_audit("email", email_id, "REQUEST_MORE_INFO", reviewer_name, {"missing_required_fields": required_missing})
-
-            title_default = f"{finalized['classification']['request_type']}: {fields.get('vendor_name') or 'Vendor'} invoice {fields.get('invoice_number') or ''}".strip()
-            t_id = create_or_update_ticket(
-                email_id=email_id,
-                status="Waiting on Requester",
-                title=title_default,
-                request_type=finalized["classification"]["request_type"],
-                queue=routing["queue"],
-                assignee=routing["assignee"],
-                priority=routing["priority"],
-                from_email=email["from"]["email"],
-                subject=email["subject"],
-                payload=st.session_state.finalized,
-            )
-            write_audit("ticket", t_id, "TICKET_CREATED_OR_UPDATED", reviewer_name, {"status": "Waiting on Requester"})
-            st.success(f"Ticket created: {t_id} (Waiting on Requester). Go to Ticket Queue.")
-
-        if approve:
-            if required_missing:
-                st.error("Cannot approve: missing required fields. Use 'Request More Info' instead.")
+            parent = followup_parent(email_id)
+            if parent:
+                reopened = add_followup(parent, email_id, reviewer_name, followup_details("NEEDS_INFO"))
+                st.success(f"Follow-up added to ticket {parent}" + ("; the requester answered, so it is Open again." if reopened else "."))
             else:
-                st.session_state.review_status = "TICKETED"
-                upsert_review_state(email_id, "TICKETED", st.session_state.finalized)
-                write_audit("email", email_id, "APPROVED", reviewer_name, {})
-
-                title_default = f"{finalized['classification']['request_type']}: {fields.get('vendor_name') or 'Vendor'} invoice {fields.get('invoice_number') or ''}".strip()
                 t_id = create_or_update_ticket(
                     email_id=email_id,
-                    status="Open",
+                    status="Waiting on Requester",
                     title=title_default,
                     request_type=finalized["classification"]["request_type"],
                     queue=routing["queue"],
@@ -418,9 +403,40 @@ def render_approval(email: dict, cached: dict, demo_users: dict, reviewer_name:
                     priority=routing["priority"],
                     from_email=email["from"]["email"],
                     subject=email["subject"],
-                    payload=st.session_state.finalized,
+                    payload=finalized,
                 )
-                write_audit("ticket", t_id, "TICKET_CREATED_OR_UPDATED", reviewer_name, {"status": "Open"})
-                st.success(f"Approved. Ticket created: {t_id}. Go to Ticket Queue.")
+                write_audit("ticket", t_id, "TICKET_CREATED_OR_UPDATED", reviewer_name, {"status": "Waiting on Requester"})
+                st.success(f"Ticket created: {t_id} (Waiting on Requester). Go to Ticket Queue.")
+
+        if approve:
+            if required_missing:
+                st.error("Cannot approve: missing required fields. Use 'Request More Info' instead.")
+            else:
+                st.session_state.review_status = "TICKETED"
+                upsert_review_state(email_id, "TICKETED", overrides)
+                write_audit("email", email_id, "APPROVED", reviewer_name, {})
+                parent = followup_parent(email_id)
+                if parent:
+                    reopened = add_followup(parent, email_id, reviewer_name, followup_details("TICKETED"))
+                    st.success(f"Approved. Follow-up added to ticket {parent}" + ("; the requester answered, so it is Open again." if reopened else "."))
+                else:
+                    t_id = create_or_update_ticket(
+                        email_id=email_id,
+                        status="Open",
+                        title=title_default,
+                        request_type=finalized["classification"]["request_type"],
+                        queue=routing["queue"],
+                        assignee=routing["assignee"],
+                        priority=routing["priority"],
+                        from_email=email["from"]["email"],
+                        subject=email["subject"],
+                        payload=finalized,
+                    )
+                    write_audit("ticket", t_id, "TICKET_CREATED_OR_UPDATED", reviewer_name, {"status": "Open"})
+                    st.success(f"Approved. Ticket created: {t_id}. Go to Ticket Queue.")
 
         st.markdown("</div>", unsafe_allow_html=True)
+
+    st.divider()
+    with st.expander("🕓 History (email + linked tickets)", expanded=False):
+        render_timeline(email_id, key="approval")
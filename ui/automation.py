@@ -0,0 +1,74 @@
+import streamlit as st
+
+from core.llm_cache import cache_stats
+from core.stp import AUTO_APPROVED, MANUAL, QA_HOLDBACK, stp_metrics, stp_settings
+
+
+def render_automation():
+    st.markdown("## 🧾 Finance Ops Intake — Automation")
+    st.markdown(
+        "<div class='muted' style='margin-top:-6px; margin-bottom:12px;'>"
+        "Straight-through processing: emails approved and ticketed at intake without a reviewer"
+        "</div>",
+        unsafe_allow_html=True,
+    )
+
+    settings = stp_settings()
+    if not settings["enabled"]:
+        st.info("Straight-through processing is off. Set `enabled = true` under `[stp]` in config.toml to turn it on.")
+
+    m = stp_metrics()
+    k1, k2, k3, k4, k5 = st.columns(5)
+    k1.metric("Auto-approved", m["auto_approved"])
+    k2.metric("Manually approved", m["manual_approved"])
+    k3.metric("Auto rate", f"{m['auto_rate'] * 100:.0f}%")
+    k4.metric("QA holdback", m["qa_holdback"])
+    k5.metric("Reviewer time saved", f"{m['latency_saved_hours']:.1f} h")
+
+    if m["median_manual_review_seconds"] is None:
+        st.caption(f"Time saved assumes {settings['manual_review_minutes']:.0f} min per manual review until approvals are logged.")
+    else:
+        st.caption(f"Time saved uses the measured median manual review of {m['median_manual_review_seconds'] / 60:.1f} min (open → approve).")
+
+    st.divider()
+    left, right = st.columns([3, 2], gap="large")
+    with left:
+        st.markdown("### By request type")
+        rows = [
+            {
+                "Request type": r["request_type"],
+                "Auto-approved": r[AUTO_APPROVED],
+                "QA holdback": r[QA_HOLDBACK],
+                "To reviewer": r[MANUAL],
+                "Min confidence": settings["min_confidence"].get(r["request_type"]),
+            }
+            for r in m["by_request_type"]
+        ]
+        if rows:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+        else:
+            st.caption("No emails evaluated yet.")
+    with right:
+        st.markdown("### Why emails went to a reviewer")
+        if m["manual_reasons"]:
+            st.dataframe(
+                [{"Reason": k, "Emails": v} for k, v in m["manual_reasons"].items()],
+                use_container_width=True,
+                hide_index=True,
+            )
+        else:
+            st.caption("None")
+        st.caption(f"QA sample rate: {settings['qa_sample_rate'] * 100:.0f}% of qualifying emails.")
+
+    st.divider()
+    st.markdown("### Model response cache")
+    cache = cache_stats()
+    if not cache["enabled"]:
+        st.caption("The model response cache is off (`enabled` under `[llm_cache]`).")
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Cached responses", cache["entries"])
+    c2.metric("Hit rate", "–" if cache["hit_rate"] is None else f"{cache['hit_rate'] * 100:.0f}%")
+    c3.metric("Tokens saved", cache["input_tokens_saved"] + cache["output_tokens_saved"])
+    c4.metric("Cost saved", f"${cache['saved_usd']:.2f}")
+    c5.metric("Evictions", cache["evictions"])
+    st.caption(f"{cache['size_mb']:.1f} MB in {cache['path']}. Inspect or prune with `python -m core.llm_cache stats|list|prune`.")
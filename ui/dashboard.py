@@ -0,0 +1,85 @@
+import pandas as pd
+import streamlit as st
+
+from core.analytics import AGING_BUCKETS, dashboard_metrics, snapshot_ready, warm_snapshot
+
+
+@st.fragment(run_every=2)
+def _snapshot_loading():
+    if snapshot_ready():
+        st.rerun()
+    st.info("Loading the dashboard snapshot… this takes a few seconds on a large ticket history.")
+
+
+def render_dashboard():
+    st.markdown("## 🧾 Finance Ops Intake — Dashboard")
+    st.markdown(
+        "<div class='muted' style='margin-top:-6px; margin-bottom:12px;'>"
+        "Backlog, aging and throughput across all queues"
+        "</div>",
+        unsafe_allow_html=True,
+    )
+
+    c1, c2 = st.columns([1.0, 4.0])
+    with c1:
+        days = st.selectbox("Throughput window", [7, 14, 30], index=1, format_func=lambda d: f"{d} days")
+    with c2:
+        st.write("")
+        st.button("🔄 Refresh")
+
+    if not snapshot_ready():
+        # The first snapshot load runs in a background thread; only this
+        # fragment re-runs until it is done.
+        warm_snapshot()
+        _snapshot_loading()
+        return
+
+    m = dashboard_metrics(days=days)
+    k1, k2, k3, k4, k5 = st.columns(5)
+    k1.metric("Open backlog", m["open"])
+    k2.metric("Older than 7 days", m["aging"][">7d"])
+    k3.metric(f"Created ({days}d)", sum(d["created"] for d in m["throughput"]))
+    k4.metric(f"Resolved ({days}d)", sum(d["resolved"] for d in m["throughput"]))
+    k5.metric("Tickets", m["tickets"])
+
+    if not m["tickets"]:
+        st.info("No tickets yet. Create one from the Approval screen.")
+        return
+
+    st.divider()
+    left, right = st.columns([3, 2], gap="large")
+    with left:
+        st.markdown("### Backlog by queue")
+        st.dataframe(m["backlog_by_queue"], use_container_width=True, hide_index=True)
+        st.markdown("### Backlog by assignee")
+        st.dataframe(
+            m["backlog_by_assignee"],
+            use_container_width=True,
+            hide_index=True,
+            column_config={"avg_age_days": st.column_config.NumberColumn("avg age (days)", format="%.1f")},
+        )
+    with right:
+        st.markdown("### Aging (open tickets)")
+        st.bar_chart(pd.DataFrame({"tickets": [m["aging"][b] for b in AGING_BUCKETS]}, index=list(AGING_BUCKETS)))
+        st.markdown("### Throughput per day")
+        st.line_chart(pd.DataFrame(m["throughput"]).set_index("day"))
+
+    st.markdown("### Time in status")
+    if m["time_in_status"]:
+        st.dataframe(
+            [
+                {
+                    "Status": r["status"],
+                    "Completed stays": r["transitions"],
+                    "Avg hours (completed)": r["avg_hours"],
+                    "Open now": r["open_now"],
+                    "Avg hours so far (open)": r["open_avg_hours"],
+                }
+                for r in m["time_in_status"]
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+    else:
+        st.caption("No status transitions in the audit log yet.")
+    st.caption(f"Snapshot refreshed in {m['refresh_ms']:.0f} ms, aggregated in {m['aggregate_ms']:.0f} ms.")
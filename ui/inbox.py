@@ -1,49 +1,29 @@
 import streamlit as st
 
-from core.db import get_review_state
-from core.tickets_full import ticket_exists_for_email
+from core.inbox import summary_rows
 
 
-def _safe_get_status(email_id: str) -> str:
-    rs = get_review_state(email_id)
-    if not rs:
-        return "NEW"
-    return rs.get("review_status") or "NEW"
-
-
-def _has_ticket(email_id: str) -> bool:
-    return ticket_exists_for_email(email_id) is not None
-
-
-def render_inbox(emails: list, agent_cache: dict, active_email_id: str):
+def render_inbox(store: dict, active_email_id: str):
     st.markdown("# 📩 Shared Finance Inbox")
     st.caption("Synthetic inbox for demo. Filter and select an email to review in Approval.")
 
     # ---- Build inbox rows with derived fields ----
-    rows = []
-    for e in emails:
-        eid = e["email_id"]
-        cache = agent_cache.get(eid, {})
-        c = cache.get("classification", {})
-        r = cache.get("routing_suggestion", {})
-
-        status = _safe_get_status(eid)
-        has_ticket = _has_ticket(eid)
-
-        rows.append(
-            {
-                "Email ID": eid,
-                "Received": e["received_at"][:19].replace("T", " "),
-                "From": e["from"]["email"],
-                "Subject": e["subject"],
-                "Status": status,
-                "Type": c.get("request_type", "UNKNOWN"),
-                "Confidence": float(c.get("confidence", 0.0)),
-                "Queue": r.get("queue", ""),
-                "Assignee": r.get("assignee", ""),
-                "Has Ticket": "Yes" if has_ticket else "No",
-            }
-        )
+    rows = [
+        {
+            "Email ID": r["email_id"],
+            "Received": r["received_at"][:19].replace("T", " "),
+            "From": r["from_email"],
+            "Subject": r["subject"],
+            "Status": r["review_status"],
+            "Type": r["request_type"],
+            "Confidence": r["confidence"],
+            "Queue": r["queue"],
+            "Assignee": r["assignee"],
+            "Has Ticket": "Yes" if r["ticket_id"] else "No",
+            "Thread": r["thread_id"],
+        }
+        for r in summary_rows(store["records"])
+    ]
 
     # ---- Filters ----
     st.markdown("### Filters")
@@ -61,6 +41,7 @@ def render_inbox(emails: list, agent_cache: dict, active_email_id: str):
         ticket_f = st.selectbox("Has ticket", ticket_opts, index=0)
     with f4:
         q = st.text_input("Search (subject / from / id)", value="").strip().lower()
+    collapse = st.checkbox("Collapse threads (show latest message per conversation)", value=False)
 
     def match(row):
         if status_f != "All" and row["Status"] != status_f:
@@ -76,6 +57,15 @@ def render_inbox(emails: list, agent_cache: dict, active_email_id: str):
 
     filtered = [r for r in rows if match(r)]
 
+    if collapse:
+        latest = {}
+        counts = {}
+        for r in filtered:
+            counts[r["Thread"]] = counts.get(r["Thread"], 0) + 1
+            if r["Thread"] not in latest or r["Received"] > latest[r["Thread"]]["Received"]:
+                latest[r["Thread"]] = r
+        filtered = [{**r, "Msgs": counts[r["Thread"]]} for r in latest.values()]
+
     st.divider()
 
     # ---- Inbox table ----
@@ -0,0 +1,111 @@
+import os
+from typing import Any
+
+import streamlit as st
+
+from core.data import build_routing_index, load_json
+from core.email_store import close_email_store
+
+
+DATA_DIR = "data"
+
+
+@st.cache_resource(show_spinner=False)
+def init_process() -> bool:
+    # Runs once per server process, not once per rerun.
+    from dotenv import load_dotenv
+    from core.db import ensure_db
+    from core.sla import backfill_sla
+
+    load_dotenv()
+    ensure_db()
+    backfill_sla()
+    return True
+
+
+def _data_path(name: str) -> str:
+    return os.path.join(DATA_DIR, name)
+
+
+def _mtime(path: str) -> int:
+    return os.stat(path).st_mtime_ns
+
+
+# The mtime argument is part of the cache key, so editing a data file
+# invalidates its entry on the next rerun.
+@st.cache_data(show_spinner=False)
+def _load_cached(path: str, mtime: int) -> Any:
+    return load_json(path)
+
+
+# One compact inbox per process (core.email_store), keyed on both source files.
+# A replaced or cleared store has its blob file closed.
+@st.cache_resource(show_spinner=False, max_entries=1, on_release=close_email_store)
+def _email_store_cached(inbox_path: str, inbox_mtime: int, cache_path: str, cache_mtime: int) -> dict:
+    from core.email_store import build_email_store
+
+    return build_email_store(inbox_path, cache_path)
+
+
+@st.cache_data(show_spinner=False)
+def _routing_index_cached(path: str, mtime: int) -> dict:
+    return build_routing_index(load_json(path))
+
+
+def load_data(name: str) -> Any:
+    path = _data_path(name)
+    return _load_cached(path, _mtime(path))
+
+
+def email_store() -> dict:
+    inbox_path = _data_path("inbox_emails.json")
+    cache_path = _data_path("agent_cache.json")
+    return _email_store_cached(inbox_path, _mtime(inbox_path), cache_path, _mtime(cache_path))
+
+
+def routing_index() -> dict:
+    path = _data_path("demo_users.json")
+    return _routing_index_cached(path, _mtime(path))
+
+
+@st.cache_resource(show_spinner=False)
+def _index_threads_cached(path: str, mtime: int) -> int:
+    from core.threads import index_threads
+
+    return len(index_threads(load_json(path)))
+
+
+@st.cache_resource(show_spinner=False)
+def _assign_shards_cached(path: str, mtime: int, cache_mtime: int) -> int:
+    from core.shards import assign_emails
+
+    return assign_emails(load_json(path), load_json(_data_path("agent_cache.json")))
+
+
+@st.cache_resource(show_spinner=False)
+def _run_stp_cached(path: str, mtime: int, cache_mtime: int, users_mtime: int) -> int:
+    from core.stp import run_stp
+
+    return len(run_stp(load_json(path), load_json(_data_path("agent_cache.json")), load_json(_data_path("demo_users.json"))))
+
+
+def ingest_inbox() -> int:
+    # Thread new emails, assign them to storage shards, then run straight-through
+    # processing on them, once per process and whenever the inbox, agent cache or
+    # routing data changes.
+    path = _data_path("inbox_emails.json")
+    mtime = _mtime(path)
+    cache_mtime = _mtime(_data_path("agent_cache.json"))
+    threaded = _index_threads_cached(path, mtime)
+    _assign_shards_cached(path, mtime, cache_mtime)
+    _run_stp_cached(path, mtime, cache_mtime, _mtime(_data_path("demo_users.json")))
+    return threaded
+
+
+def invalidate_reference_data():
+    _load_cached.clear()
+    _email_store_cached.clear()
+    _index_threads_cached.clear()
+    _assign_shards_cached.clear()
+    _run_stp_cached.clear()
+    _routing_index_cached.clear()
@@ -1,7 +1,9 @@
 import json
 import streamlit as st
 
-from core.tickets_full import list_tickets, ticket_metrics
+from core.sla import escalate_breached, next_ticket_for
+from core.tickets_full import bulk_update_tickets, list_tickets, ticket_metrics
+from ui.timeline import render_timeline
 
 
 def pill(text: str, bg: str, fg: str = "white") -> str:
@@ -20,7 +22,44 @@ def pill(text: str, bg: str, fg: str = "white") -> str:
     """
 
 
-def render_ticket_queue(demo_users: dict):
+def _render_bulk_actions(ticket_ids: list, demo_users: dict, reviewer_name: str):
+    last = st.session_state.pop("bulk_result", None)
+    if last:
+        failed = [r for r in last if not r["ok"]]
+        changed = [r for r in last if r["ok"] and r["changed"]]
+        st.success(f"Bulk update: {len(changed)} changed, {len(last) - len(changed) - len(failed)} unchanged, {len(failed)} failed.")
+        if failed:
+            st.dataframe(
+                [{"Ticket": r["ticket_id"], "Error": r["error"]} for r in failed],
+                use_container_width=True,
+                hide_index=True,
+            )
+
+    with st.expander("Bulk actions", expanded=False):
+        select_all = st.checkbox(f"Select all {len(ticket_ids)} filtered tickets", value=False)
+        selected = ticket_ids if select_all else st.multiselect("Tickets", ticket_ids, default=[])
+
+        options = {
+            "status": demo_users["ticket_statuses"],
+            "queue": [q["display_name"] for q in demo_users["queues"]],
+            "assignee": [a["name"] for a in demo_users["assignees"]],
+            "priority": demo_users["priorities"],
+        }
+        b1, b2, b3 = st.columns([1.0, 1.6, 1.0])
+        with b1:
+            field = st.selectbox("Change", list(options), format_func=str.title)
+        with b2:
+            value = st.selectbox("To", options[field])
+        with b3:
+            st.write("")
+            apply = st.button(f"Apply to {len(selected)}", use_container_width=True, disabled=not selected)
+
+        if apply:
+            st.session_state.bulk_result = bulk_update_tickets(selected, {field: value}, reviewer_name)
+            st.rerun()
+
+
+def render_ticket_queue(demo_users: dict, reviewer_name: str = "Demo Reviewer"):
     st.markdown("## 🧾 Finance Ops Intake — Ticket Queue")
     st.markdown(
         "<div class='muted' style='margin-top:-6px; margin-bottom:12px;'>"
@@ -42,7 +81,9 @@ def render_ticket_queue(demo_users: dict):
     assignees = ["All"] + sorted({a["name"] for a in demo_users["assignees"]})
     statuses = ["All", "Open", "Waiting on Requester", "In Progress", "Resolved"]
 
-    f1, f2, f3, f4 = st.columns([1.2, 1.2, 1.2, 1.0])
+    sort_modes = {"Recently updated": "updated", "Due soon": "due_soon"}
+
+    f1, f2, f3, f4, f5 = st.columns([1.2, 1.2, 1.2, 1.0, 1.0])
     with f1:
         status_f = st.selectbox("Status", statuses, index=0)
     with f2:
@@ -50,9 +91,28 @@ def render_ticket_queue(demo_users: dict):
     with f3:
         assignee_f = st.selectbox("Assignee", assignees, index=0)
     with f4:
+        sort_f = st.selectbox("Sort", list(sort_modes), index=0)
+    with f5:
         st.button("🔄 Refresh", use_container_width=True)
 
-    filters = {"status": status_f, "queue": queue_f, "assignee": assignee_f}
+    s1, s2, s3 = st.columns([1.2, 1.2, 2.6])
+    with s1:
+        if st.button("⏫ Escalate breached SLAs", use_container_width=True):
+            bumped = escalate_breached(reviewer_name)
+            st.session_state.sla_message = f"Escalated {len(bumped)} ticket(s) with breached SLAs."
+            st.rerun()
+    with s2:
+        if assignee_f != "All" and st.button(f"▶ Next for {assignee_f}", use_container_width=True):
+            nxt = next_ticket_for(assignee_f)
+            st.session_state.sla_message = f"Next up: {nxt['ticket_id']} (due {nxt['sla_due_at'][:16].replace('T', ' ')} UTC)" if nxt else f"No workable tickets for {assignee_f}."
+            if nxt:
+                st.session_state.queue_selected_ticket = nxt["ticket_id"]
+    with s3:
+        msg = st.session_state.pop("sla_message", None)
+        if msg:
+            st.info(msg)
+
+    filters = {"status": status_f, "queue": queue_f, "assignee": assignee_f, "sort": sort_modes[sort_f]}
     tickets = list_tickets(filters)
 
     if not tickets:
@@ -72,13 +132,17 @@ def render_ticket_queue(demo_users: dict):
                     "Queue": t["queue"],
                     "Assignee": t["assignee"],
                     "Title": t["title"],
+                    "SLA due (UTC)": (t.get("sla_due_at") or "")[:16].replace("T", " "),
                     "Updated": t["updated_at"][:19].replace("T", " "),
                 }
             )
         st.dataframe(table_rows, use_container_width=True, hide_index=True)
 
         ticket_ids = [t["ticket_id"] for t in tickets]
-        selected = st.selectbox("Open ticket", ticket_ids, index=0)
+        _render_bulk_actions(ticket_ids, demo_users, reviewer_name)
+
+        preferred = st.session_state.get("queue_selected_ticket")
+        selected = st.selectbox("Open ticket", ticket_ids, index=ticket_ids.index(preferred) if preferred in ticket_ids else 0)
 
     with right:
         st.markdown("### Ticket Detail")
@@ -108,3 +172,6 @@ def render_ticket_queue(demo_users: dict):
         with st.expander("Draft response (snapshot)", expanded=False):
             st.write(f"**Subject:** {payload['draft_response']['subject']}")
             st.text_area("Body", payload["draft_response"]["body"], height=220, disabled=True)
+
+        with st.expander("History", expanded=False):
+            render_timeline(t["email_id"], key="ticket_queue")
@@ -0,0 +1,52 @@
+import json
+import streamlit as st
+
+from core.db import email_history, get_audit_details
+
+
+PAGE_SIZE = 25
+
+
+def render_timeline(email_id: str, key: str):
+    # Cursor stack per panel: the last entry is the page being shown.
+    state_key = f"timeline_{key}_{email_id}"
+    cursors = st.session_state.setdefault(state_key, [None])
+
+    page = email_history(email_id, limit=PAGE_SIZE, before=cursors[-1])
+    events = page["events"]
+
+    if not events:
+        st.caption("No history recorded yet.")
+        return
+
+    st.dataframe(
+        [
+            {
+                "When": e["timestamp"][:19].replace("T", " "),
+                "Entity": f"{e['entity_type']} {e['entity_id']}",
+                "Action": e["action"],
+                "By": e["actor_name"],
+            }
+            for e in events
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    p1, p2, p3 = st.columns([1.0, 1.0, 2.0])
+    with p1:
+        if st.button("← Newer", key=f"{state_key}_newer", disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with p2:
+        if st.button("Older →", key=f"{state_key}_older", disabled=page["next_cursor"] is None, use_container_width=True):
+            cursors.append(page["next_cursor"])
+            st.rerun()
+    with p3:
+        st.caption(f"Page {len(cursors)} · {len(events)} events")
+
+    # Details are only decoded for the one event being inspected.
+    labels = {e["event_id"]: f"{e['timestamp'][:19].replace('T', ' ')} · {e['action']}" for e in events}
+    inspect = st.selectbox("Inspect event", ["—"] + list(labels), format_func=lambda x: labels.get(x, x), key=f"{state_key}_inspect")
+    if inspect != "—":
+        st.code(json.dumps(get_audit_details([inspect]).get(inspect, {}), indent=2, ensure_ascii=False), language="json")